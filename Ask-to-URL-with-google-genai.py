@@ -1,12 +1,14 @@
 import os
 import re
 import requests
-from flask import Flask, request, render_template_string
+from html import escape
+from flask import Flask, Response, jsonify, request, stream_with_context
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 import google.generativeai as genai
+from model_registry import get_model_registry, warmup_in_background
+from fetch_cache import cached_get, get_fetch_cache
 
 # Load environment variables
 print("Loading environment variables...")
@@ -21,6 +23,10 @@ if not google_api_key:
 print("Google API key loaded successfully.")
 genai.configure(api_key=google_api_key)
 
+# Shared model clients, created once instead of per request
+models = get_model_registry()
+warmup_in_background(["gemini-pro"])
+
 # URL validation function
 def is_valid_url(url):
     """Check if the URL is in a valid format."""
@@ -35,9 +41,9 @@ def extract_text_from_url(url):
     """Fetch and extract text from the URL."""
     print(f"Fetching and extracting text from URL: {url}")
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Check if the response status is OK (200)
-        print("Response received successfully from URL.")
+        # Served from the fetch cache while fresh, otherwise revalidated with a conditional GET
+        response = cached_get(url, timeout=10)
+        print(f"Response received successfully from URL ({response.source}).")
         
         soup = BeautifulSoup(response.content, 'html.parser')
         paragraphs = [p.get_text(strip=True) for p in soup.find_all('p')]
@@ -61,49 +67,30 @@ def extract_text_from_url(url):
         return None, f"Request failed: {str(e)}"
 
 
-# Function to process text using Google Generative AI
-def process_text_with_google_genai(text):
-    """Summarize text using Google Generative AI."""
-    print("Processing text with Google Generative AI...")
-    try:
-        # Initialize the Google Generative AI model using langchain integration
-        model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
-        # prompt = PromptTemplate(input_variables=["text"], template="Summarize this article: {text}")
-        prompt = PromptTemplate(
-            input_variables=["text"], 
-            template="""
-                Summarize the main insights from the article provided below. Include:
-                
-                - An overview of the main arguments or ideas.
-                - Important data or evidence presented.
-                - Practical implications or recommendations, if available.
-                
-                Article content: {text}
-            """
-        )
-
-
+# Prompt used to summarize the extracted article
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["text"], 
+    template="""
+        Summarize the main insights from the article provided below. Include:
         
-        # Generate a summary from the extracted text
-        response = model.invoke(prompt.format(text=text))
+        - An overview of the main arguments or ideas.
+        - Important data or evidence presented.
+        - Practical implications or recommendations, if available.
         
-        # Assuming response is an AIMessage object, access its content
-        if hasattr(response, 'content'):
-            summary = response.content  # Adjust based on actual attribute name
-        else:
-            print("Error: Response object does not have 'content' attribute.")
-            return None, "Invalid response format from Google Generative AI."
-
-        # Check if summary text is valid
-        if not summary or not summary.strip():
-            print("Google Generative AI returned an empty response.")
-            return None, "Google Generative AI returned an empty response."
-        
-        print("Text processed successfully by Google Generative AI.")
-        return summary, None
-    except Exception as e:
-        print(f"Google Generative AI processing failed: {str(e)}")
-        return None, f"Google Generative AI processing failed: {str(e)}"
+        Article content: {text}
+    """
+)
+
+
+# Function to stream the summary as the model generates it
+def stream_text_with_google_genai(text):
+    """Yield summary text chunks from Google Generative AI."""
+    print("Streaming text from Google Generative AI...")
+    model = models.get_chat_model("gemini-pro", temperature=0.3)
+    with models.timed("gemini-pro"):
+        for chunk in model.stream(SUMMARY_PROMPT.format(text=text)):
+            if chunk.content:
+                yield chunk.content
 
 
 # Home route (render the input form)
@@ -152,28 +139,9 @@ def index():
         </html>
     '''
 
-@app.route('/extract_and_process', methods=['POST'])
-def extract_and_process():
-    print("Received POST request at /extract_and_process")
-    data = request.form
-    url = data.get('url')
-    if not url:
-        return '''<html><body><h1>Error</h1><p>URL is required.</p></body></html>''', 400
-    if not is_valid_url(url):
-        return '''<html><body><h1>Error</h1><p>Invalid URL format. Ensure it includes http:// or https://</p></body></html>''', 400
-
-    print("Starting text extraction...")
-    text, error = extract_text_from_url(url)
-    if error:
-        return f'''<html><body><h1>Error</h1><p>{error}</p></body></html>''', 500
-
-    print("Starting text processing with Google Generative AI...")
-    processed_text, error = process_text_with_google_genai(text)
-    if error:
-        return f'''<html><body><h1>Error</h1><p>{error}</p></body></html>''', 500
-
-    print("Rendering result page with extracted and processed text.")
-    return render_template_string(f'''
+# Result page, split around the summary so it can be streamed
+def render_result_head(text):
+    return f'''
         <!DOCTYPE html>
         <html lang="en">
             <head>
@@ -224,13 +192,16 @@ def extract_and_process():
                             <div class="mb-4">
                                 <h4 class="section-title">Extracted Text</h4>
                                 <div class="text-block">
-                                    <p>{text}</p>
+                                    <p>{escape(text)}</p>
                                 </div>
                             </div>
                             <div>
                                 <h4 class="section-title">Processed Text (Summary)</h4>
                                 <div class="text-block">
-                                    <p>{processed_text}</p>
+                                    <p>'''
+
+
+RESULT_PAGE_TAIL = '''</p>
                                 </div>
                             </div>
                         </div>
@@ -244,8 +215,51 @@ def extract_and_process():
                 <script src="https://maxcdn.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js"></script>
             </body>
         </html>
-    ''')
+'''
+
+
+@app.route('/extract_and_process', methods=['POST'])
+def extract_and_process():
+    print("Received POST request at /extract_and_process")
+    data = request.form
+    url = data.get('url')
+    if not url:
+        return '''<html><body><h1>Error</h1><p>URL is required.</p></body></html>''', 400
+    if not is_valid_url(url):
+        return '''<html><body><h1>Error</h1><p>Invalid URL format. Ensure it includes http:// or https://</p></body></html>''', 400
+
+    print("Starting text extraction...")
+    text, error = extract_text_from_url(url)
+    if error:
+        return f'''<html><body><h1>Error</h1><p>{error}</p></body></html>''', 500
+
+    print("Streaming processed text from Google Generative AI...")
+
+    # The page is sent in pieces: the extracted text first, then the summary as it is generated
+    def generate():
+        yield render_result_head(text)
+        try:
+            for chunk in stream_text_with_google_genai(text):
+                yield escape(chunk)
+        except Exception as e:
+            print(f"Google Generative AI processing failed: {str(e)}")
+            yield escape(f"Google Generative AI processing failed: {str(e)}")
+        yield RESULT_PAGE_TAIL
+        print("Finished streaming result page.")
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
+
+# Model call counters and latency histograms
+@app.route('/metrics')
+def metrics():
+    return jsonify(models.stats())
+
 
+# Fetch cache size and hit counters
+@app.route('/metrics/fetch-cache')
+def fetch_cache_metrics():
+    return jsonify(get_fetch_cache().stats())
 
 
 if __name__ == '__main__':
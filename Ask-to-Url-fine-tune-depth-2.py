@@ -1,15 +1,18 @@
 import os
 import re
-import requests
 import logging
-from flask import Flask, request, render_template_string
+from html import escape
+from flask import Flask, Response, jsonify, request, stream_with_context
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from colorama import Fore, Style
+from embedding_engine import BatchedEmbeddings
+from ann_index import build_faiss_store
+from keyword_index import KeywordIndex, hybrid_search
+from fetch_cache import get_fetch_cache
+from crawler import crawl
+from model_registry import get_model_registry
 
 # Load environment variables
 load_dotenv()
@@ -35,7 +38,8 @@ if not google_api_key:
     log_error("Google API key not found in environment variables.")
     raise EnvironmentError("Google API key not found in environment variables.")
 
-genai = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
+models = get_model_registry()
+genai = models.get_chat_model("gemini-pro", temperature=0.3)
 
 # URL validation function
 def is_valid_url(url):
@@ -43,38 +47,20 @@ def is_valid_url(url):
     url_pattern = r'^(http|https)://[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(/.*)?$'
     return bool(re.match(url_pattern, url))
 
-# Recursive extraction function
-def extract_recursive(url, visited=None, depth=1, max_depth=2):
+# Breadth-first site extraction
+def extract_site(url, max_depth=2):
     """
-    Recursively fetch and extract text and URLs from the provided URL.
+    Fetch the page and the pages it links to, concurrently and within the crawl budgets.
     """
-    if visited is None:
-        visited = set()
-    if depth > max_depth or url in visited:
-        return "", []
-    try:
-        log_info(f"Fetching URL: {url} at depth {depth}")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        visited.add(url)
-
-        # Extract text
-        text = ' '.join([p.get_text(strip=True) for p in soup.find_all('p')]).strip()
-        log_info(f"Extracted text from {url}:\n{text}\n")  # Log the extracted text
-
-        # Extract URLs
-        all_urls = [a['href'] for a in soup.find_all('a', href=True) if is_valid_url(a['href'])]
-        log_info(f"Found URLs on {url}:\n{all_urls}\n")  # Log the extracted URLs
-
-        # Recursively fetch data from extracted URLs
-        for link in all_urls:
-            child_text, _ = extract_recursive(link, visited, depth + 1, max_depth)
-            text += " " + child_text
-        return text, list(visited)
-    except Exception as e:
-        log_error(f"Error extracting data from {url}: {e}")
-        return "", []
+    log_info(f"Crawling {url} to depth {max_depth}")
+    result = crawl(url, max_depth=max_depth,
+                   on_page=lambda page_url, depth, text: log_info(f"Fetched {page_url} at depth {depth} ({len(text)} chars)"))
+    for failed_url, error in result.errors.items():
+        log_error(f"Error extracting data from {failed_url}: {error}")
+    if result.truncated:
+        log_warning("Crawl budget reached; continuing with the pages fetched so far.")
+    log_info(f"Crawled {len(result.pages)} pages in {result.elapsed:.1f}s")
+    return result.text, result.visited
 
 # Text chunking
 def get_text_chunks(raw_text):
@@ -82,67 +68,77 @@ def get_text_chunks(raw_text):
     splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
     return splitter.split_text(raw_text)
 
+# Chunk IDs shared by the vector store and the keyword index
+def get_chunk_ids(text_chunks):
+    return [f"chunk-{i:05d}" for i in range(len(text_chunks))]
+
 # Create FAISS vector store
 def get_vector_store(text_chunks):
     """Create a vector store using Google Generative AI embeddings."""
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")  # Google AI embeddings
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)  # Create vector store
+    embeddings = BatchedEmbeddings(model="models/embedding-001")  # Cached, batched Google AI embeddings
+    vectors = embeddings.embed_matrix(text_chunks)
+    vector_store = build_faiss_store(text_chunks, vectors, embeddings, ids=get_chunk_ids(text_chunks))  # Index type picked from the corpus size
     vector_store.save_local("faiss_index")  # Save vector store locally
     log_info("Vector store created and saved locally.")
     return vector_store
 
-# Generate Q&A or Summarization
-def process_text_with_google_genai(vector_store, query=None, task="summarize"):
+# Create BM25 keyword index over the same chunks
+def get_keyword_index(text_chunks):
+    """Create an inverted index for keyword retrieval next to the vector store."""
+    keyword_index = KeywordIndex.from_texts(text_chunks, get_chunk_ids(text_chunks))
+    os.makedirs("faiss_index", exist_ok=True)
+    keyword_index.save(os.path.join("faiss_index", "keywords.json"))  # Saved with the vector store
+    log_info("Keyword index created and saved locally.")
+    return keyword_index
+
+# Build the summarization or Q&A prompt from the vector store
+def build_prompt(vector_store, query=None, task="summarize", keyword_index=None):
+    if task == "summarize":
+        # Retrieve all documents for summarization
+        docs = vector_store.similarity_search("", k=10)
+        text = " ".join([doc.page_content for doc in docs])
+        prompt = PromptTemplate(
+            input_variables=["text"],
+            template="Summarize the following content: {text}"
+        )
+        return prompt.format(text=text)
+
+    # Q&A Task: retrieve chunks most relevant to the query, by meaning and by exact terms
+    docs = hybrid_search(vector_store, keyword_index, query, k=8)
+    retrieved_text = " ".join([doc.page_content for doc in docs])
+    
+    # Log retrieved text
+    log_info(f"Retrieved Text for Query '{query}':\n{retrieved_text}\n")
+
+    prompt = PromptTemplate(
+        input_variables=["text", "query"],
+        template="""
+        Based on the following text, identify and list all products, models, or vehicles mentioned.
+        Provide a summary if relevant.
+
+        Context:
+        {text}
+
+        Question:
+        {query}
+
+        Answer in bullet points with product names and short descriptions where applicable.
+        """
+    )
+    return prompt.format(text=retrieved_text, query=query)
+
+# Stream Q&A or Summarization as it is generated
+def stream_text_with_google_genai(vector_store, query=None, task="summarize", keyword_index=None):
     try:
-        if task == "summarize":
-            # Retrieve all documents for summarization
-            docs = vector_store.similarity_search("", k=10)
-            text = " ".join([doc.page_content for doc in docs])
-            prompt = PromptTemplate(
-                input_variables=["text"],
-                template="Summarize the following content: {text}"
-            )
-            formatted_prompt = prompt.format(text=text)
-        else:  # Q&A Task
-            # Retrieve chunks most relevant to the query
-            docs = vector_store.similarity_search(query, k=30)  # Increased scope
-            retrieved_text = " ".join([doc.page_content for doc in docs])
-            
-            # Log retrieved text
-            log_info(f"Retrieved Text for Query '{query}':\n{retrieved_text}\n")
-            
-            # Filter relevant chunks based on potential product-related keywords
-            keywords = ["product", "model", "car", "features", "vehicle", "EV"]
-            filtered_text = " ".join(
-                chunk for chunk in retrieved_text.split("\n")
-                if any(keyword.lower() in chunk.lower() for keyword in keywords)
-            )
-            log_info(f"Filtered Text for Query '{query}':\n{filtered_text}\n")
-
-            prompt = PromptTemplate(
-                input_variables=["text", "query"],
-                template="""
-                Based on the following text, identify and list all products, models, or vehicles mentioned.
-                Provide a summary if relevant.
-
-                Context:
-                {text}
-
-                Question:
-                {query}
-
-                Answer in bullet points with product names and short descriptions where applicable.
-                """
-            )
-            formatted_prompt = prompt.format(text=filtered_text, query=query)
-
-        # Send prompt to Generative AI
-        response = genai.invoke(formatted_prompt)
-        log_info("Processed text with Google Generative AI successfully.")
-        return response.content if hasattr(response, "content") else "No response content found."
+        formatted_prompt = build_prompt(vector_store, query, task, keyword_index)
+        with models.timed("gemini-pro"):
+            for chunk in genai.stream(formatted_prompt):
+                if chunk.content:
+                    yield chunk.content
+        log_info("Streamed text from Google Generative AI successfully.")
     except Exception as e:
         log_error(f"Error processing text with Google Gemini AI: {e}")
-        return str(e)
+        yield str(e)
 
 
 # Home route
@@ -187,6 +183,32 @@ def index():
     </html>
     '''
 
+# Result page, split so the visited URLs and the model output can be streamed
+RESULT_PAGE_HEAD = '''
+    <!DOCTYPE html>
+    <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>URL Analysis Result</title>
+        </head>
+        <body>
+            <h1>Results</h1>
+            <h2>Visited URLs</h2>
+            <ul>
+'''
+
+RESULT_PAGE_MIDDLE = '''
+            </ul>
+            <h2>Processed Result</h2>
+            <p style="white-space: pre-wrap;">'''
+
+RESULT_PAGE_TAIL = '''</p>
+            <a href="/">Go Back</a>
+        </body>
+    </html>
+'''
+
 @app.route('/process', methods=['POST'])
 def process():
     url = request.form.get('url')
@@ -197,9 +219,9 @@ def process():
         log_warning("Invalid URL format provided.")
         return "Invalid URL format", 400
     
-    # Extract data recursively
+    # Extract data from the page and its links
     log_info(f"Starting extraction for URL: {url}")
-    aggregated_text, visited_urls = extract_recursive(url)
+    aggregated_text, visited_urls = extract_site(url)
     if not aggregated_text:
         log_error("No data found or error during extraction.")
         return "Error extracting data or no data found.", 500
@@ -211,40 +233,36 @@ def process():
     log_info("Splitting text into chunks and creating vector store.")
     text_chunks = get_text_chunks(aggregated_text)
     vector_store = get_vector_store(text_chunks)
+    keyword_index = get_keyword_index(text_chunks)
     
-    # Process the task
+    # Stream the result page: visited URLs first, then the model output as it arrives
     log_info(f"Task selected: {task}")
-    if task == "summarize":
-        result = process_text_with_google_genai(vector_store)
-        log_info(f"Processed Summarization Result:\n{result}")
-    elif task == "qa":
+    if task == "qa":
         log_info(f"User Query: {query}")
-        result = process_text_with_google_genai(vector_store, query=query, task="qa")
-        log_info(f"Processed Q&A Result:\n{result}")
-    
-    # Render the result
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>URL Analysis Result</title>
-        </head>
-        <body>
-            <h1>Results</h1>
-            <h2>Visited URLs</h2>
-            <ul>
-                {% for u in visited_urls %}
-                    <li>{{ u }}</li>
-                {% endfor %}
-            </ul>
-            <h2>Processed Result</h2>
-            <p>{{ result }}</p>
-            <a href="/">Go Back</a>
-        </body>
-    </html>
-    ''', visited_urls=visited_urls, result=result)
+
+    def generate():
+        yield RESULT_PAGE_HEAD
+        for u in visited_urls:
+            yield f"<li>{escape(u)}</li>"
+        yield RESULT_PAGE_MIDDLE
+        for chunk in stream_text_with_google_genai(vector_store, query=query, task=task, keyword_index=keyword_index):
+            yield escape(chunk)
+        yield RESULT_PAGE_TAIL
+        log_info("Finished streaming result page.")
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
+
+# Model call counters and latency histograms
+@app.route('/metrics')
+def metrics():
+    return jsonify(models.stats())
+
+
+# Fetch cache size and hit counters
+@app.route('/metrics/fetch-cache')
+def fetch_cache_metrics():
+    return jsonify(get_fetch_cache().stats())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+import math
+import time
+import uuid
+import numpy as np
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# Corpus sizes at which the index type changes
+FLAT_MAX_VECTORS = 20000
+HNSW_MAX_VECTORS = 1000000
+IVF_SQ_MAX_VECTORS = 5000000
+# Search-time knobs for the approximate index types
+IVF_NPROBE = 32
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+
+# Function to pick a FAISS factory string for a corpus of n vectors of the given dimension
+def choose_index_spec(n, dim):
+    if n <= FLAT_MAX_VECTORS:
+        return "Flat"
+    if n <= HNSW_MAX_VECTORS:
+        # Graph search over 8-bit scalar-quantized vectors: 4x less memory than float32
+        return f"HNSW{HNSW_M},SQ8"
+    nlist = 1 << int(math.log2(4 * math.sqrt(n)))
+    if n <= IVF_SQ_MAX_VECTORS:
+        # Inverted lists over 8-bit scalar codes: recall close to HNSW without the graph's memory
+        return f"IVF{nlist},SQ8"
+    # Product quantization trades some recall for dim/2 bytes per vector, 8x less than float32
+    m = next(m for m in (dim // 2, dim) if m and dim % m == 0)
+    return f"IVF{nlist},PQ{m}x8"
+
+
+# Function to tell whether LangChain's FAISS.delete is safe: it assumes remove_ids renumbers the remaining
+# rows, which only sequential indexes do; IVF keeps the old IDs and HNSW cannot remove at all
+def supports_remove(spec):
+    return spec == "Flat"
+
+
+# Function to set the search-time parameters of an approximate index
+def tune_index(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+# Function to read stored vectors back out of an index by row, instead of embedding the texts again.
+# Exact for flat indexes; quantized indexes return their decoded codes.
+def reconstruct_vectors(index, rows=None):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        # Inverted lists are organized by list, so row lookups need the row-to-list map
+        ivf.make_direct_map()
+    if rows is None:
+        return index.reconstruct_n(0, index.ntotal)
+    if not len(rows):
+        return np.zeros((0, index.d), dtype=np.float32)
+    return np.vstack([index.reconstruct(int(row)) for row in rows])
+
+
+# Function to build and fill a raw FAISS index from a float32 matrix
+def build_index(vectors, spec=None):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    spec = spec or choose_index_spec(n, dim)
+    index = faiss.index_factory(dim, spec)
+    if not index.is_trained:
+        # Training on a sample is enough for the coarse quantizer and codebooks
+        sample = vectors[np.random.default_rng(0).choice(n, min(n, 100000), replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    tune_index(index)
+    return index
+
+
+# Function to wrap a raw index as a LangChain FAISS store
+def build_faiss_store(texts, vectors, embeddings, metadatas=None, ids=None, spec=None):
+    ids = ids or [str(uuid.uuid4()) for _ in texts]
+    metadatas = metadatas or [{} for _ in texts]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    index = build_index(vectors, spec)
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+# Function to measure recall@k and latency of an index against exact search
+def evaluate_recall(index, vectors, k=10, n_queries=200, seed=0):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    # Perturbed copies of stored vectors behave like real queries that land near the data
+    queries = vectors[picks] + rng.normal(0, 0.01, size=(len(picks), vectors.shape[1])).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+
+    hits = sum(len(set(truth[i]) & set(found[i])) for i in range(len(queries)))
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "k": k,
+        "queries": len(queries),
+        "ms_per_query": elapsed * 1000 / len(queries),
+        "bytes_per_vector": _bytes_per_vector(index, len(vectors)),
+    }
+
+
+def _bytes_per_vector(index, n):
+    return len(faiss.serialize_index(index)) / n if n else 0.0
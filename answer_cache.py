@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Answers are reused for this long, and near-duplicate questions above this cosine similarity hit
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+# Function to normalize a question so trivial variations share one cache entry
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers keyed by (index version, normalized question), with near-duplicate lookup."""
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 similarity=ANSWER_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _expire(self, now):
+        for key in [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]:
+            del self._entries[key]
+
+    def _hit(self, key, entry, exact):
+        self._entries.move_to_end(key)
+        if exact:
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_seconds += entry["latency"]
+        return entry["answer"]
+
+    # Function to look up an answer; returns None on a miss
+    def get(self, index_version, question, query_vector=None):
+        now = time.time()
+        key = (index_version, normalize_question(question))
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._hit(key, entry, exact=True)
+            if query_vector is not None:
+                # Entries built on another version of the index can never match, so they are skipped
+                candidates = [(k, e) for k, e in self._entries.items() if k[0] == index_version and e["vector"] is not None]
+                if candidates:
+                    matrix = np.stack([e["vector"] for _, e in candidates])
+                    query = np.asarray(query_vector, dtype=np.float32)
+                    query = query / (np.linalg.norm(query) or 1.0)
+                    scores = matrix @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        return self._hit(*candidates[best], exact=False)
+            self.misses += 1
+            return None
+
+    def put(self, index_version, question, answer, query_vector=None, latency=0.0):
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        key = (index_version, normalize_question(question))
+        with self._lock:
+            # A new index version makes every older answer stale
+            for stale in [k for k in self._entries if k[0] != index_version and k[0][0] == index_version[0]]:
+                del self._entries[stale]
+            self._entries[key] = {"answer": answer, "vector": vector, "created": time.time(), "latency": latency}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+_default_cache = AnswerCache()
+
+
+# Function to get the process-wide answer cache
+def get_answer_cache():
+    return _default_cache
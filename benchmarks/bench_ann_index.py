@@ -0,0 +1,48 @@
+"""Compare FAISS index types on synthetic embeddings: build time, recall@k, latency and memory.
+
+Usage: python benchmarks/bench_ann_index.py [--n 100000] [--dim 768] [--specs Flat "HNSW32,SQ8" "IVF1024,PQ96x8"]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import build_index, choose_index_spec, evaluate_recall
+
+
+# Function to generate clustered unit vectors, which resemble text embeddings more than uniform noise
+def make_vectors(n, dim, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--specs", nargs="+", default=None)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.n, args.dim)
+    specs = args.specs or ["Flat", "HNSW32,SQ8", choose_index_spec(max(args.n, 1000001), args.dim),
+                          choose_index_spec(max(args.n, 5000001), args.dim)]
+    print(f"{args.n} vectors x {args.dim} dims; auto choice: {choose_index_spec(args.n, args.dim)}")
+    print(f"{'index':<22}{'build s':>10}{'recall@' + str(args.k):>12}{'ms/query':>10}{'bytes/vec':>11}")
+    for spec in specs:
+        start = time.perf_counter()
+        index = build_index(vectors, spec)
+        build_seconds = time.perf_counter() - start
+        report = evaluate_recall(index, vectors, k=args.k)
+        print(f"{spec:<22}{build_seconds:>10.1f}{report['recall_at_k']:>12.3f}"
+              f"{report['ms_per_query']:>10.3f}{report['bytes_per_vector']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark cold-start import time per page of main.py, and the first render and rerun of the app.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--pages ChatBot "Chat with PDF"] [--no-render]
+
+Every measurement runs in a fresh interpreter, so nothing is served from an earlier import.
+The imports of each page are read from main.py itself, so the benchmark follows the app as it changes.
+"""
+import os
+import ast
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+IMPORT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+"""
+
+RENDER_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({main!r}, default_timeout=120)
+start = time.perf_counter()
+app.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - start
+print(json.dumps({{"first": first, "rerun": rerun, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def _imports(nodes):
+    return [ast.unparse(node) for node in nodes if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+# Function to read the module-level imports and each page's own imports from main.py
+def page_imports(path=MAIN):
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    shell = _imports(tree.body)
+    pages = {}
+    for node in tree.body:
+        # The pages are one if/elif chain on the selected menu entry
+        while isinstance(node, ast.If):
+            test = node.test
+            if isinstance(test, ast.Compare) and isinstance(test.comparators[0], ast.Constant):
+                pages[test.comparators[0].value] = _imports(node.body)
+            node = node.orelse[0] if len(node.orelse) == 1 else None
+    return shell, pages
+
+
+# Function to time a block of import statements in a fresh interpreter, in seconds
+def time_imports(imports, repeat):
+    script = IMPORT_SCRIPT.format(root=ROOT, imports="\n".join(imports))
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            return None, out.stderr.strip().splitlines()[-1]
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples), None
+
+
+def time_render():
+    script = RENDER_SCRIPT.format(root=ROOT, main=MAIN)
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        return None, out.stderr.strip().splitlines()[-1]
+    return json.loads(out.stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", default=None)
+    parser.add_argument("--no-render", action="store_true")
+    args = parser.parse_args()
+
+    shell, pages = page_imports()
+    print(f"median of {args.repeat} cold interpreters")
+    print(f"{'page':<22}{'import ms':>12}")
+    shell_time, error = time_imports(shell, args.repeat)
+    print(f"{'(app shell)':<22}{shell_time * 1000:>12.0f}" if error is None else f"{'(app shell)':<22}  failed: {error}")
+    for page in args.pages or pages:
+        # A page's cold start is the shell plus the page's own imports
+        page_time, error = time_imports(shell + pages.get(page, []), args.repeat)
+        print(f"{page:<22}{page_time * 1000:>12.0f}" if error is None else f"{page:<22}  failed: {error}")
+
+    if not args.no_render:
+        result, error = time_render()
+        if error is not None:
+            print(f"render failed: {error}")
+        else:
+            print(f"first render {result['first'] * 1000:.0f} ms, rerun {result['rerun'] * 1000:.0f} ms")
+            for message in result["errors"]:
+                print(f"  app raised: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import re
+import hashlib
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from context_builder import count_tokens
+from model_registry import get_model_registry
+
+COMPARE_MODEL = "gemini-1.5-flash"
+# Changed regions are packed into map calls of at most this many tokens
+MAP_CHUNK_TOKENS = int(os.getenv("COMPARE_MAP_CHUNK_TOKENS", "6000"))
+MAP_WORKERS = 4
+# Changed regions shorter than this are shown with the paragraph before them, so a clause keeps its heading
+MIN_PARAGRAPH_CHARS = 200
+
+MAP_PROMPT = """
+    Below are the regions that differ between two versions of a document, aligned paragraph by paragraph.
+    "Removed" text is only in Document 1, "Added" text is only in Document 2, and "Changed" shows both versions.
+
+    {regions}
+
+    List every substantive difference as a bullet: what changed, and what it means. Ignore formatting and whitespace.
+    """
+
+REDUCE_PROMPT = """
+    Two documents were compared. {equal} of {total} paragraphs are identical; the notes below cover every
+    paragraph that differs.
+
+    {notes}
+
+    Describe key similarities, differences, and potential conclusions.
+    """
+
+
+# Function to split extracted PDF text into paragraph units. Boundaries depend only on the text around
+# them, so an edit changes its own paragraph and never shifts how later text is split
+def split_paragraphs(text):
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text):
+        # PDF text often has no blank lines; long blocks also break where a line ends a sentence
+        pieces = re.split(r"(?<=[.:;!?])\s*\n", block) if len(block) > 4 * MIN_PARAGRAPH_CHARS else [block]
+        paragraphs += [piece.strip() for piece in pieces if piece.strip()]
+    return paragraphs
+
+
+# Function to hash a paragraph so layout-only differences still match
+def paragraph_hash(paragraph):
+    normalized = re.sub(r"\s+", " ", paragraph).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+# Function to align two documents and return the regions that differ
+def diff_regions(paragraphs1, paragraphs2):
+    matcher = difflib.SequenceMatcher(None, [paragraph_hash(p) for p in paragraphs1],
+                                      [paragraph_hash(p) for p in paragraphs2], autojunk=False)
+    regions = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        before = "\n".join(paragraphs1[i1:i2])
+        after = "\n".join(paragraphs2[j1:j2])
+        if tag == "replace":
+            # Changed paragraphs usually differ in a few words; show only the changed lines of each side
+            before, after = _changed_lines(before, after)
+        # Short paragraphs are merged with their unchanged neighbour only here, for the prompt
+        context = ""
+        if i1 and len(before) + len(after) < MIN_PARAGRAPH_CHARS:
+            context = paragraphs1[i1 - 1][-MIN_PARAGRAPH_CHARS:]
+        regions.append({"kind": {"replace": "Changed", "delete": "Removed", "insert": "Added"}[tag],
+                        "before": before, "after": after, "context": context, "position": (i1, j1),
+                        "paragraphs": (i2 - i1, j2 - j1)})
+    return regions
+
+
+def _changed_lines(before, after):
+    lines1, lines2 = before.splitlines(), after.splitlines()
+    matcher = difflib.SequenceMatcher(None, lines1, lines2, autojunk=False)
+    kept1, kept2 = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            kept1 += lines1[i1:i2]
+            kept2 += lines2[j1:j2]
+    return "\n".join(kept1) or before, "\n".join(kept2) or after
+
+
+def _format_region(region):
+    context = f"Following the unchanged text: ...{region['context']}\n" if region.get("context") else ""
+    if region["kind"] == "Removed":
+        return f"Removed (paragraph {region['position'][0] + 1} of Document 1):\n{context}{region['before']}"
+    if region["kind"] == "Added":
+        return f"Added (paragraph {region['position'][1] + 1} of Document 2):\n{context}{region['after']}"
+    return (f"Changed (paragraph {region['position'][0] + 1} of Document 1):\n{context}Document 1: {region['before']}\n"
+            f"Document 2: {region['after']}")
+
+
+# Function to pack formatted regions into batches that fit one map call
+def batch_regions(regions, max_tokens=MAP_CHUNK_TOKENS):
+    pieces = []
+    for region in regions:
+        text = _format_region(region)
+        # A region larger than one call, such as a rewritten chapter, is split across calls
+        step = max_tokens * 3
+        pieces += [text] if count_tokens(text) <= max_tokens else [
+            text[start:start + step] if not start else f"(continued)\n{text[start:start + step]}"
+            for start in range(0, len(text), step)]
+    batches, current, used = [], [], 0
+    for text in pieces:
+        tokens = count_tokens(text)
+        if current and used + tokens > max_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Function to compare two documents, sending only their differences to the model
+def compare_documents(text1, text2, model_name=COMPARE_MODEL, max_workers=MAP_WORKERS):
+    models = get_model_registry()
+    paragraphs1, paragraphs2 = split_paragraphs(text1), split_paragraphs(text2)
+    regions = diff_regions(paragraphs1, paragraphs2)
+    total = max(len(paragraphs1), len(paragraphs2))
+    stats = {
+        "paragraphs": total,
+        "equal_paragraphs": len(paragraphs1) - sum(region["paragraphs"][0] for region in regions),
+        "regions": len(regions),
+        "document_tokens": count_tokens(text1) + count_tokens(text2),
+        "sent_tokens": 0,
+        "map_calls": 0,
+    }
+    if not regions:
+        return {"summary": "The two documents have the same content; no differences were found.", "stats": stats}
+
+    model = models.get_generative_model(model_name)
+
+    def generate(prompt):
+        with models.timed(model_name):
+            response = model.generate_content(prompt)
+        return response.text if response else ""
+
+    batches = batch_regions(regions)
+    if len(batches) == 1:
+        # Small differences fit in the reduce call itself
+        notes = batches[0]
+    else:
+        map_prompts = [MAP_PROMPT.format(regions="\n\n".join(batch)) for batch in batches]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            notes = list(pool.map(generate, map_prompts))
+        stats["map_calls"] = len(map_prompts)
+        stats["sent_tokens"] += sum(count_tokens(prompt) for prompt in map_prompts)
+    reduce_prompt = REDUCE_PROMPT.format(equal=stats["equal_paragraphs"], total=total, notes="\n\n".join(notes))
+    stats["sent_tokens"] += count_tokens(reduce_prompt)
+    return {"summary": generate(reduce_prompt) or "Comparison not available.", "stats": stats}
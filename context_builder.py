@@ -0,0 +1,99 @@
+import os
+import re
+import numpy as np
+from langchain_core.documents import Document
+
+# Upper bound on the tokens of retrieved context placed in one prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Chunks retrieved as candidates before selection
+CONTEXT_CANDIDATES = 12
+# Weight of relevance against novelty in maximal marginal relevance
+MMR_LAMBDA = 0.7
+# Shortest shared span that counts as splitter overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 32
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+# Function to estimate the token count of a text without calling the API.
+# Gemini's tokenizer averages about four characters per token on English prose; short words and
+# punctuation are at least one token each, so the larger of the two estimates is used.
+def count_tokens(text):
+    return max(len(_TOKEN_PATTERN.findall(text)), (len(text) + 3) // 4)
+
+
+# Function to cut a text down to at most the given number of estimated tokens
+def truncate_to_tokens(text, budget):
+    end = min(len(text), budget * 4)
+    while end and count_tokens(text[:end]) > budget:
+        end = end * 9 // 10
+    return text[:end]
+
+
+# Function to find the position of a chunk within its document, from IDs such as "3f2a...:00012"
+def _chunk_position(doc):
+    match = re.search(r"(\d+)$", doc.metadata.get("chunk_id", ""))
+    return (doc.metadata.get("doc_id"), int(match.group(1))) if match else None
+
+
+# Function to return how many leading characters of current repeat the end of previous
+def overlap_length(previous, current, max_overlap=None):
+    if len(current) < MIN_OVERLAP_CHARS:
+        return 0
+    window = len(previous) if max_overlap is None else max_overlap
+    start = max(0, len(previous) - window)
+    probe = current[:MIN_OVERLAP_CHARS]
+    position = previous.find(probe, start)
+    while position != -1:
+        # The earliest match that runs to the end of previous is the longest overlap
+        if current.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+
+# Function to join selected chunks in document order, dropping the overlap between neighbours
+def assemble_context(docs):
+    ordered = sorted(docs, key=lambda doc: _chunk_position(doc) or (None, 0))
+    passages = []
+    for doc in ordered:
+        text = doc.page_content
+        position = _chunk_position(doc)
+        if passages and position and passages[-1]["position"] == (position[0], position[1] - 1):
+            text = text[overlap_length(passages[-1]["text"], text):]
+            passages[-1]["text"] += text
+            passages[-1]["position"] = position
+            continue
+        passages.append({"text": text, "position": position, "metadata": dict(doc.metadata)})
+    return [Document(page_content=passage["text"], metadata=passage["metadata"]) for passage in passages]
+
+
+# Function to pick chunks by maximal marginal relevance until the token budget is spent
+def build_context(query_vector, docs, doc_vectors, budget=CONTEXT_TOKEN_BUDGET, lambda_mult=MMR_LAMBDA):
+    if not docs:
+        return []
+    vectors = np.asarray(doc_vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected = []
+    remaining = list(range(len(docs)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+        # Cost is measured on the assembled text, so overlap with a chosen neighbour is free
+        cost = sum(count_tokens(doc.page_content) for doc in assemble_context([docs[i] for i in selected + [best]]))
+        if cost <= budget:
+            selected.append(best)
+    if not selected:
+        # Not even one chunk fits: send the start of the most relevant one
+        top = docs[int(np.argmax(relevance))]
+        return [Document(page_content=truncate_to_tokens(top.page_content, budget), metadata=dict(top.metadata))]
+    return assemble_context([docs[i] for i in selected])
@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from model_registry import get_model_registry
+
+# Recent turns sent verbatim with every message; older turns are folded into a summary
+CHAT_WINDOW_TOKENS = int(os.getenv("CHAT_WINDOW_TOKENS", "3000"))
+CHAT_SUMMARY_TOKENS = 500
+# Turns shown on the ChatBot page before "Show earlier messages"
+CHAT_DISPLAY_TURNS = 20
+
+SUMMARY_PROMPT = """
+        Update the running summary of a conversation between a user and an assistant.
+        Keep facts, names, numbers, decisions and open questions; drop small talk.
+        Answer with the new summary only, in at most {words} words.
+
+        Current summary:
+        {summary}
+
+        New turns:
+        {turns}
+    """
+
+# Summaries are produced off the request path; one thread is enough since each session folds rarely
+_summarizer = ThreadPoolExecutor(max_workers=1)
+
+
+class ConversationMemory:
+    """Chat history whose model payload stays bounded: a running summary plus a token-limited window of recent turns."""
+
+    def __init__(self, model_name="gemini-pro", window_tokens=CHAT_WINDOW_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS):
+        self.model_name = model_name
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.models = get_model_registry()
+        # Every turn, for display only; never sent to the model as a whole
+        self.turns = []
+        self.summary = ""
+        self.last_payload_tokens = 0
+        self._window = []
+        self._folding = []
+        self._future = None
+        self._lock = threading.Lock()
+
+    def _tokens(self, turns):
+        # Imported here so opening the ChatBot page does not load NumPy and LangChain
+        from context_builder import count_tokens
+        return sum(count_tokens(text) for _, text in turns)
+
+    # Function to apply a finished summary; until then the turns being folded are still sent verbatim
+    def _collect_summary(self):
+        if self._future is None or not self._future.done():
+            return
+        try:
+            self.summary = self._future.result()
+            self._folding = []
+        except Exception as e:
+            # Keep the turns verbatim and try again with the next fold
+            print(f"Conversation summary failed: {e}")
+            self._window = self._folding + self._window
+            self._folding = []
+        self._future = None
+
+    def _summarize(self, summary, turns):
+        transcript = "\n".join(f"{role}: {text}" for role, text in turns)
+        prompt = SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4, summary=summary or "(none)", turns=transcript)
+        model = self.models.get_generative_model(self.model_name)
+        with self.models.timed(self.model_name):
+            return model.generate_content(prompt).text.strip()
+
+    # Function to move the oldest turn pairs out of the window and summarize them in the background
+    def _fold(self):
+        self._collect_summary()
+        if self._future is not None or self._tokens(self._window) <= self.window_tokens:
+            return
+        cut = 0
+        while cut < len(self._window) - 2 and self._tokens(self._window[cut:]) > self.window_tokens:
+            cut += 2
+        if not cut:
+            return
+        self._folding, self._window = self._window[:cut], self._window[cut:]
+        self._future = _summarizer.submit(self._summarize, self.summary, list(self._folding))
+
+    # Function to build the request contents: summary, recent turns, then the new message
+    def _contents(self, message):
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            contents.append({"role": "model", "parts": ["Understood, I will keep that in mind."]})
+        for role, text in self._folding + self._window:
+            contents.append({"role": role, "parts": [text]})
+        contents.append({"role": "user", "parts": [message]})
+        return contents
+
+    # Generator that sends a message and yields the reply as it streams in
+    def send(self, message):
+        with self._lock:
+            self._collect_summary()
+            contents = self._contents(message)
+            self.last_payload_tokens = self._tokens((content["role"], content["parts"][0]) for content in contents)
+        model = self.models.get_generative_model(self.model_name)
+        pieces = []
+        with self.models.timed(self.model_name):
+            for chunk in model.generate_content(contents, stream=True):
+                pieces.append(chunk.text)
+                yield chunk.text
+        reply = "".join(pieces)
+        with self._lock:
+            self.turns += [("user", message), ("model", reply)]
+            self._window += [("user", message), ("model", reply)]
+            self._fold()
@@ -0,0 +1,168 @@
+import re
+import zlib
+import numpy as np
+
+# Signature length, and its split into LSH bands of rows; 16 bands of 8 rows find pairs above ~0.7 Jaccard
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+# Estimated Jaccard similarity at which two documents count as near-duplicates
+DUPLICATE_THRESHOLD = 0.8
+SHINGLE_WORDS = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Page number of the LSH key that stands for a whole document
+_WHOLE_DOCUMENT = -1
+
+
+# Function to hash every run of k consecutive words of a text to a 32-bit value
+def shingle_hashes(text, k=SHINGLE_WORDS):
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    tokens = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    if len(tokens) < k:
+        k = len(tokens)
+    # Polynomial rolling combination of the k word hashes, computed for all positions at once
+    hashes = np.zeros(len(tokens) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        hashes = (hashes * np.uint64(1000003) + tokens[offset:len(tokens) - k + 1 + offset]) & _MAX_HASH
+    return np.unique(hashes)
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed family of random hash permutations."""
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=(permutations, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=(permutations, 1), dtype=np.uint64)
+        self.permutations = permutations
+
+    def signature(self, hashes, block=4096):
+        signature = np.full(self.permutations, _MAX_HASH, dtype=np.uint64)
+        # Blocks keep the permutations x shingles matrix small for long documents
+        for start in range(0, len(hashes), block):
+            chunk = hashes[start:start + block][None, :]
+            permuted = ((self.a * chunk + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature
+
+
+class LSHIndex:
+    """Buckets MinHash signatures band by band so only likely near-duplicates are compared."""
+
+    def __init__(self, bands=LSH_BANDS, permutations=MINHASH_PERMUTATIONS):
+        self.bands = bands
+        self.rows = permutations // bands
+        self._buckets = [{} for _ in range(bands)]
+
+    def add(self, key, signature):
+        for band, buckets in enumerate(self._buckets):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            buckets.setdefault(band_key, []).append(key)
+
+    # Function to list every pair of keys that share at least one bucket
+    def candidate_pairs(self):
+        pairs = set()
+        for buckets in self._buckets:
+            for keys in buckets.values():
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        pairs.add((min(keys[i], keys[j]), max(keys[i], keys[j])))
+        return pairs
+
+
+class Corpus:
+    """MinHash signatures of a set of documents and of their pages, with near-duplicate clusters."""
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS, threshold=DUPLICATE_THRESHOLD):
+        self.hasher = MinHasher(permutations)
+        self.lsh = LSHIndex(bands, permutations)
+        self.threshold = threshold
+        self.names = []
+        self.texts = []
+        # Documents without extractable text (e.g. scanned PDFs) have no signature and are never matched
+        self.empty = []
+        self._signatures = []
+        self._page_signatures = {}
+
+    # Function to add one document given as a list of page texts; returns its index
+    def add_document(self, name, pages):
+        index = len(self.names)
+        self.names.append(name)
+        self.texts.append("".join(pages))
+        page_signatures = [(page, self.hasher.signature(shingle_hashes(text)))
+                           for page, text in enumerate(pages) if text.strip()]
+        if not page_signatures:
+            self.empty.append(index)
+            self._signatures.append(None)
+            return index
+        # The minimum over page signatures is the signature of the whole document's shingle set
+        signature = np.min([page_signature for _, page_signature in page_signatures], axis=0)
+        self._signatures.append(signature)
+        # Pages are indexed on their own so a page shared by otherwise different documents is found too;
+        # the whole document is indexed as well for near-duplicates whose page breaks moved
+        self.lsh.add((index, _WHOLE_DOCUMENT), signature)
+        for page, page_signature in page_signatures:
+            self._page_signatures[(index, page)] = page_signature
+            self.lsh.add((index, page), page_signature)
+        return index
+
+    # Function to estimate the Jaccard similarity of every pair of documents at once
+    def similarity_matrix(self):
+        if not self._signatures:
+            return np.zeros((0, 0))
+        n = len(self._signatures)
+        permutations = self.hasher.permutations
+        signatures = np.stack([signature if signature is not None else np.zeros(permutations, dtype=np.uint64)
+                               for signature in self._signatures])
+        matrix = np.empty((n, n), dtype=np.float32)
+        # Row blocks bound the n x n x permutations comparison for large corpora
+        block = max(1, 2 ** 22 // (n * permutations))
+        for start in range(0, n, block):
+            matrix[start:start + block] = (signatures[start:start + block, None, :] == signatures[None, :, :]).mean(axis=2)
+        matrix[self.empty, :] = 0.0
+        matrix[:, self.empty] = 0.0
+        return matrix
+
+    # Function to list pairs of near-duplicate documents with their estimated similarity, most similar first
+    def similar_pairs(self, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        # Documents that share a bucket on any page or as a whole are compared as whole documents
+        candidates = {(first[0], second[0]) for first, second in self.lsh.candidate_pairs() if first[0] != second[0]}
+        pairs = []
+        for i, j in candidates:
+            similarity = float((self._signatures[i] == self._signatures[j]).mean())
+            if similarity >= threshold:
+                pairs.append((i, j, similarity))
+        return sorted(pairs, key=lambda pair: (-pair[2], pair[:2]))
+
+    # Function to list near-duplicate pages of different documents as (doc, page, doc, page, similarity)
+    def shared_pages(self, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        matches = []
+        for first, second in self.lsh.candidate_pairs():
+            if first[0] == second[0] or _WHOLE_DOCUMENT in (first[1], second[1]):
+                continue
+            similarity = float((self._page_signatures[first] == self._page_signatures[second]).mean())
+            if similarity >= threshold:
+                matches.append((*first, *second, similarity))
+        return sorted(matches, key=lambda match: (-match[4], match[:4]))
+
+    # Function to group documents into clusters of near-duplicates
+    def clusters(self):
+        parent = list(range(len(self.names)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j, _ in self.similar_pairs():
+            parent[find(i)] = find(j)
+        groups = {}
+        for i in range(len(self.names)):
+            groups.setdefault(find(i), []).append(i)
+        return sorted(groups.values(), key=lambda group: (-len(group), group[0]))
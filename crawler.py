@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import asyncio
+from urllib.parse import urlsplit, urldefrag
+import aiohttp
+from bs4 import BeautifulSoup
+from fetch_cache import get_fetch_cache
+
+# Global limits of one crawl; whatever was fetched when a budget runs out is returned
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "200"))
+CRAWL_TIME_BUDGET_SECONDS = float(os.getenv("CRAWL_TIME_BUDGET_SECONDS", "30"))
+CRAWL_CONCURRENCY = 16
+# Politeness towards each site: parallel requests and the minimum gap between request starts
+CRAWL_PER_HOST = 4
+CRAWL_HOST_DELAY_SECONDS = 0.1
+CRAWL_REQUEST_TIMEOUT_SECONDS = 10
+CRAWL_USER_AGENT = "GeminiURLAnalyzer/1.0"
+
+_URL_PATTERN = re.compile(r'^(http|https)://[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(/.*)?$')
+
+
+# Function to pull the paragraph text and absolute links out of a page
+def parse_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    text = ' '.join([p.get_text(strip=True) for p in soup.find_all('p')]).strip()
+    links = [urldefrag(a['href'])[0] for a in soup.find_all('a', href=True) if _URL_PATTERN.match(a['href'])]
+    return text, list(dict.fromkeys(links))
+
+
+class CrawlResult:
+    """Pages fetched by one crawl in breadth-first order, with what was skipped or failed."""
+
+    def __init__(self):
+        self.pages = []
+        self.errors = {}
+        self.truncated = False
+        self.elapsed = 0.0
+
+    @property
+    def text(self):
+        return " ".join(page["text"] for page in self.pages if page["text"])
+
+    @property
+    def visited(self):
+        return [page["url"] for page in self.pages]
+
+
+class Crawler:
+    """Breadth-first crawler with a bounded pool of async workers sharing keep-alive connections."""
+
+    def __init__(self, max_depth=2, max_pages=CRAWL_MAX_PAGES, time_budget=CRAWL_TIME_BUDGET_SECONDS,
+                 concurrency=CRAWL_CONCURRENCY, per_host=CRAWL_PER_HOST, host_delay=CRAWL_HOST_DELAY_SECONDS,
+                 on_page=None, cache=None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.time_budget = time_budget
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.on_page = on_page
+        self.cache = cache or get_fetch_cache()
+        self._hosts = {}
+
+    def _host(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = {"slots": asyncio.Semaphore(self.per_host), "lock": asyncio.Lock(), "next": 0.0}
+        return self._hosts[host]
+
+    # Function to fetch the body of one page: fresh from the cache, or after the host's politeness gap
+    async def fetch(self, session, url):
+        entry = await asyncio.to_thread(self.cache.lookup, url)
+        if entry and entry["fresh"]:
+            return entry["body"]
+        host = self._host(url)
+        async with host["slots"]:
+            async with host["lock"]:
+                delay = host["next"] - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                host["next"] = time.monotonic() + self.host_delay
+            async with session.get(url, headers=self.cache.conditional_headers(entry)) as response:
+                if response.status == 304 and entry:
+                    await asyncio.to_thread(self.cache.revalidate, url, response.headers)
+                    return entry["body"]
+                response.raise_for_status()
+                if "html" not in response.headers.get("Content-Type", "text/html"):
+                    return b""
+                body = await response.read()
+        await asyncio.to_thread(self.cache.put, url, response.headers, body)
+        return body
+
+    async def _worker(self, session, frontier, seen, result):
+        while True:
+            url, depth, order = await frontier.get()
+            try:
+                content = await self.fetch(session, url)
+                # Parsing is CPU work; keep it off the event loop so other fetches keep flowing
+                text, links = await asyncio.to_thread(parse_page, content) if content else ("", [])
+                result.pages.append({"url": url, "depth": depth, "order": order, "text": text})
+                if self.on_page:
+                    self.on_page(url, depth, text)
+                if depth < self.max_depth:
+                    for link in links:
+                        if link in seen:
+                            continue
+                        if len(seen) >= self.max_pages:
+                            result.truncated = True
+                            break
+                        seen.add(link)
+                        frontier.put_nowait((link, depth + 1, len(seen)))
+            except Exception as e:
+                result.errors[url] = str(e) or type(e).__name__
+            finally:
+                frontier.task_done()
+
+    async def crawl_async(self, url):
+        result = CrawlResult()
+        started = time.monotonic()
+        frontier = asyncio.Queue()
+        seen = {url}
+        frontier.put_nowait((url, 1, 0))
+        timeout = aiohttp.ClientTimeout(total=CRAWL_REQUEST_TIMEOUT_SECONDS, connect=5)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": CRAWL_USER_AGENT}) as session:
+            workers = [asyncio.create_task(self._worker(session, frontier, seen, result))
+                       for _ in range(self.concurrency)]
+            try:
+                await asyncio.wait_for(frontier.join(), timeout=self.time_budget)
+            except asyncio.TimeoutError:
+                result.truncated = True
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        # Breadth-first order: by depth, then in the order links were discovered
+        result.pages.sort(key=lambda page: (page["depth"], page["order"]))
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def crawl(self, url):
+        return asyncio.run(self.crawl_async(url))
+
+
+# Function to crawl a site breadth-first from url; depth 1 is the page itself
+def crawl(url, max_depth=2, **options):
+    return Crawler(max_depth=max_depth, **options).crawl(url)
@@ -0,0 +1,162 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# Default location and size of the on-disk embedding cache
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+# Function to build the content-addressed key of one chunk
+def embedding_cache_key(model, task_type, text):
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}|{task_type}|{digest}"
+
+
+class EmbeddingCache:
+    """Persistent embedding cache: SQLite for the keys, one memory-mapped float32 file per vector size."""
+
+    def __init__(self, cache_dir=EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._vectors = {}
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS slot_counts (dim INTEGER PRIMARY KEY, used INTEGER NOT NULL)")
+        self._db.commit()
+
+    # Memory-mapped matrix holding every vector of a given size, grown by doubling
+    def _matrix(self, dim, min_rows=0):
+        matrix = self._vectors.get(dim)
+        if matrix is not None and matrix.shape[0] >= min_rows:
+            return matrix
+        path = os.path.join(self.cache_dir, f"vectors_{dim}.f32")
+        row_bytes = dim * 4
+        rows = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        if rows < min_rows:
+            rows = max(min_rows, rows * 2, 1024)
+            with open(path, "ab") as fh:
+                fh.truncate(rows * row_bytes)
+        if matrix is not None:
+            matrix.flush()
+        matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim))
+        self._vectors[dim] = matrix
+        return matrix
+
+    # Function to take a freed slot or the next unused one; only called inside put_many's write transaction
+    def _allocate_slot(self, dim):
+        row = self._db.execute("SELECT rowid, slot FROM free_slots WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE rowid = ?", (row[0],))
+            return row[1]
+        used = self._db.execute("SELECT used FROM slot_counts WHERE dim = ?", (dim,)).fetchone()
+        slot = used[0] if used else 0
+        self._db.execute("INSERT OR REPLACE INTO slot_counts (dim, used) VALUES (?, ?)", (dim, slot + 1))
+        return slot
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        victims = self._db.execute(
+            "SELECT key, dim, slot FROM entries ORDER BY last_used LIMIT ?", (excess,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _, _ in victims])
+        self._db.executemany("INSERT INTO free_slots (dim, slot) VALUES (?, ?)", [(dim, slot) for _, dim, slot in victims])
+        self.evictions += len(victims)
+
+    # Function to look up many chunks at once; misses come back as None
+    def get_many(self, model, task_type, texts):
+        keys = [embedding_cache_key(model, task_type, text) for text in texts]
+        results = [None] * len(keys)
+        with self._lock:
+            found = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, dim, slot in self._db.execute(
+                    f"SELECT key, dim, slot FROM entries WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = (dim, slot)
+            for i, key in enumerate(keys):
+                if key in found:
+                    dim, slot = found[key]
+                    # Another process may have grown the file since this one mapped it
+                    results[i] = np.array(self._matrix(dim, slot + 1)[slot])
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._db.commit()
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return results
+
+    # Function to store freshly computed vectors; the write lock keeps slots unique across processes
+    def put_many(self, model, task_type, texts, vectors):
+        with self._lock:
+            now = time.time()
+            touched = set()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for text, vector in zip(texts, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    dim = vector.shape[0]
+                    key = embedding_cache_key(model, task_type, text)
+                    row = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                    slot = row[0] if row else self._allocate_slot(dim)
+                    matrix = self._matrix(dim, slot + 1)
+                    matrix[slot] = vector
+                    touched.add(dim)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO entries (key, dim, slot, last_used) VALUES (?, ?, ?, ?)",
+                        (key, dim, slot, now),
+                    )
+                for dim in touched:
+                    self._vectors[dim].flush()
+                self._evict()
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide embedding cache
+def get_embedding_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
@@ -0,0 +1,133 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from langchain_core.embeddings import Embeddings
+from embedding_cache import get_embedding_cache
+
+# The batch embedding endpoint accepts at most 100 texts per request
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_MAX_WORKERS = 8
+EMBEDDING_MAX_RETRIES = 5
+
+# Errors after which the request is retried with less concurrency
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease cap on in-flight requests."""
+
+    def __init__(self, max_limit, initial_limit=2):
+        self.max_limit = max_limit
+        self.limit = min(initial_limit, max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1)
+            self._cond.notify_all()
+
+
+# Function to embed one API-sized batch, backing off when the API pushes back
+def _embed_batch(texts, model, task_type, limiter):
+    for attempt in range(EMBEDDING_MAX_RETRIES):
+        limiter.acquire()
+        try:
+            result = genai.embed_content(model=model, content=texts, task_type=task_type)
+        except RETRYABLE_ERRORS:
+            limiter.release(throttled=True)
+            if attempt == EMBEDDING_MAX_RETRIES - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30))
+            continue
+        except Exception:
+            limiter.release()
+            raise
+        limiter.release()
+        return result["embedding"]
+
+
+# Function to embed many texts in batches through a bounded thread pool; callers that embed from several
+# threads pass one shared limiter so the concurrency cap and its backoff cover all of them
+def embed_texts(texts, model="models/embedding-001", task_type="retrieval_document",
+                batch_size=EMBEDDING_BATCH_SIZE, max_workers=EMBEDDING_MAX_WORKERS, cache=None, limiter=None):
+    """Return a float32 matrix whose row i is the embedding of texts[i]."""
+    texts = list(texts)
+    cache = cache or get_embedding_cache()
+    cached = cache.get_many(model, task_type, texts)
+
+    # Only the first occurrence of each uncached text is sent to the API
+    pending = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            pending.setdefault(texts[i], []).append(i)
+    unique_missing = list(pending)
+
+    dim = next((vector.shape[0] for vector in cached if vector is not None), None)
+    matrix = np.empty((len(texts), dim), dtype=np.float32) if dim else None
+    matrix_lock = threading.Lock()
+
+    def store(rows, vectors):
+        nonlocal matrix
+        with matrix_lock:
+            if matrix is None:
+                matrix = np.empty((len(texts), len(vectors[0])), dtype=np.float32)
+            for row_ids, vector in zip(rows, vectors):
+                matrix[row_ids] = vector
+
+    for i, vector in enumerate(cached):
+        if vector is not None:
+            store([i], [vector])
+
+    if unique_missing:
+        limiter = limiter or AdaptiveLimiter(max_workers)
+        batches = [unique_missing[start:start + batch_size] for start in range(0, len(unique_missing), batch_size)]
+
+        def run(batch):
+            vectors = _embed_batch(batch, model, task_type, limiter)
+            store([pending[text] for text in batch], vectors)
+            cache.put_many(model, task_type, batch, vectors)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for future in [pool.submit(run, batch) for batch in batches]:
+                future.result()
+
+    if matrix is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return matrix
+
+
+class BatchedEmbeddings(Embeddings):
+    """LangChain embeddings backed by embed_texts, so FAISS gets cached, batched vectors."""
+
+    def __init__(self, model="models/embedding-001", batch_size=EMBEDDING_BATCH_SIZE, max_workers=EMBEDDING_MAX_WORKERS):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def embed_matrix(self, texts):
+        return embed_texts(texts, self.model, "retrieval_document", self.batch_size, self.max_workers)
+
+    def embed_documents(self, texts):
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text):
+        return embed_texts([text], self.model, "retrieval_query", max_workers=1)[0].tolist()
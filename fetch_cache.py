@@ -0,0 +1,163 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+from email.utils import formatdate
+import requests
+
+# Fetched pages are kept here compressed, up to a total size, and reused while fresh
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "fetch_cache")
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Freshness when the server sends no Cache-Control max-age
+FETCH_CACHE_TTL_SECONDS = int(os.getenv("FETCH_CACHE_TTL_SECONDS", "3600"))
+
+
+# Function to read how long a response may be reused without revalidation; None means do not store it
+def freshness_seconds(headers, default=FETCH_CACHE_TTL_SECONDS):
+    cache_control = (headers.get("Cache-Control") or "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else default
+
+
+class FetchCache:
+    """SQLite cache of HTTP response bodies with ETag / Last-Modified revalidation and LRU eviction by size."""
+
+    def __init__(self, cache_dir=FETCH_CACHE_DIR, max_bytes=FETCH_CACHE_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "fetch.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, content_type TEXT, etag TEXT, last_modified TEXT, body BLOB NOT NULL, "
+            "size INTEGER NOT NULL, fetched_at REAL NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    # Function to look up a URL; the entry says whether it is still fresh or needs revalidation
+    def lookup(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_type, etag, last_modified, body, fetched_at, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            content_type, etag, last_modified, body, fetched_at, expires_at = row
+            fresh = expires_at > time.time()
+            if fresh:
+                self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        return {"url": url, "content_type": content_type, "etag": etag, "last_modified": last_modified,
+                "body": zlib.decompress(body), "fetched_at": fetched_at, "fresh": fresh}
+
+    # Function to build the headers of a conditional GET for a stale entry
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+            elif not entry["etag"]:
+                headers["If-Modified-Since"] = formatdate(entry["fetched_at"], usegmt=True)
+        return headers
+
+    # Function to store a body fetched from the network; every call counts as a miss
+    def put(self, url, headers, body):
+        ttl = freshness_seconds(headers)
+        if ttl is None:
+            with self._lock:
+                self.misses += 1
+            return
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, headers.get("Content-Type"), headers.get("ETag"), headers.get("Last-Modified"),
+                 compressed, len(compressed), now, now + ttl, now),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                url_evicted, size = self._db.execute(
+                    "SELECT url, size FROM responses ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                self._db.execute("DELETE FROM responses WHERE url = ?", (url_evicted,))
+                total -= size
+            self._db.commit()
+            self.misses += 1
+
+    # Function to record a 304 Not Modified: the stored body is fresh again for another TTL
+    def revalidate(self, url, headers):
+        ttl = freshness_seconds(headers)
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET expires_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                "WHERE url = ?",
+                (time.time() + (ttl or 0), headers.get("ETag"), headers.get("Last-Modified"), url),
+            )
+            self._db.commit()
+            self.revalidated += 1
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+        }
+
+
+class FetchedPage:
+    """A response body and where it came from: "cache", "revalidated" or "network"."""
+
+    def __init__(self, url, content, content_type, source):
+        self.url = url
+        self.content = content
+        self.content_type = content_type
+        self.source = source
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_session = requests.Session()
+
+
+# Function to get the process-wide fetch cache
+def get_fetch_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FetchCache()
+        return _default_cache
+
+
+# Function to GET a URL through the cache with a pooled session; raises like requests on HTTP errors
+def cached_get(url, timeout=10, cache=None):
+    cache = cache or get_fetch_cache()
+    entry = cache.lookup(url)
+    if entry and entry["fresh"]:
+        return FetchedPage(url, entry["body"], entry["content_type"], "cache")
+    response = _session.get(url, timeout=timeout, headers=cache.conditional_headers(entry))
+    if response.status_code == 304 and entry:
+        cache.revalidate(url, response.headers)
+        return FetchedPage(url, entry["body"], entry["content_type"], "revalidated")
+    response.raise_for_status()
+    cache.put(url, response.headers, response.content)
+    return FetchedPage(url, response.content, response.headers.get("Content-Type"), "network")
@@ -1,17 +1,15 @@
 import os
-import asyncio
 from dotenv import load_dotenv
-from PIL import Image
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
+from model_registry import get_model_registry, warmup_in_background
 import time
 
+# Heavy dependencies (LangChain, FAISS, PyPDF2, PIL, NumPy) are imported inside the functions that
+# need them, so a page only pays for the subsystems it uses
+
+# Namespace used when no collection is given; same value as vector_store.DEFAULT_NAMESPACE
+DEFAULT_NAMESPACE = "default"
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -21,104 +19,162 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 # Configuring google.generativeai with API key
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Shared model clients; optionally created and connected at process start
+models = get_model_registry()
+warmup_in_background()
+
 # Function to load the Gemini-Pro model
 def load_gemini_pro_model(model_name="gemini-pro"):
-    gemini_pro_model = genai.GenerativeModel(model_name)
+    gemini_pro_model = models.get_generative_model(model_name)
     return gemini_pro_model
 
 # Function to get a response from Gemini-Pro model
 def get_gemini_response(input, image, prompt):
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content([input, image[0], prompt])
+    model = models.get_generative_model('gemini-1.5-flash')
+    with models.timed('gemini-1.5-flash'):
+        response = model.generate_content([input, image[0], prompt])
     return response.text
 
 # Function to set up input image for processing
 def input_image_setup(uploaded_file):
     if uploaded_file is not None:
-        # Read the file into bytes
-        bytes_data = uploaded_file.getvalue()
-        image_parts = [
-            {
-                "mime_type": uploaded_file.type,  # Get the mime type of the uploaded file
-                "data": bytes_data
-            }
-        ]
+        from image_pipeline import get_processed_image
+        # Downscaled, metadata-free WebP payload, cached by the content of the upload
+        processed = get_processed_image(uploaded_file.getvalue())
+        image_parts = [processed.as_part()]
         return image_parts
     else:
         raise FileNotFoundError("No file uploaded")
 
-# Function to upload audio file to Gemini API
+# Function to upload audio file to Gemini API, reusing the remote file for content seen before
 def upload_audio_file(file_path):
+    from media_uploads import get_upload_manager
     try:
-        return genai.upload_file(path=file_path)
+        return get_upload_manager().upload(file_path)
     except Exception as e:
         raise Exception(f"Failed to upload file: {e}")
 
-# Function to generate transcription from an audio file
-def generate_transcription(file_path):
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    your_file = upload_audio_file(file_path)
-    prompt = "Generate transcription from the audio, only extract speech and ignore background audio."
-    response = model.generate_content([prompt, your_file])
+# Returned when the model produced no transcription; never cached
+NO_TRANSCRIPTION = "No transcription available."
+
+# Function to transcribe a media file, cached by (content hash, prompt, model)
+def transcribe_media(file_path, prompt, model_name='gemini-1.5-flash'):
+    from media_uploads import get_upload_manager, file_sha256
+    uploads = get_upload_manager()
+    content_hash = file_sha256(file_path)
+    cached = uploads.get_transcription(content_hash, prompt, model_name)
+    if cached is not None:
+        return cached
+    model = models.get_generative_model(model_name)
+    try:
+        media_file = uploads.upload(file_path, content_hash)
+    except Exception as e:
+        raise Exception(f"Failed to upload file: {e}")
+    with models.timed(model_name):
+        response = model.generate_content([prompt, media_file])
     if response.parts:
         transcription = ''.join(part.text for part in response.parts)
+        uploads.put_transcription(content_hash, prompt, model_name, transcription)
         return transcription
     else:
-        return "No transcription available."
+        return NO_TRANSCRIPTION
+
+# Generator yielding a transcription as it grows; long recordings are transcribed as parallel segments
+def stream_media_transcription(file_path, prompt):
+    from segmented_transcriber import SegmentedTranscriber, should_segment
+    if should_segment(file_path):
+        yield from SegmentedTranscriber().stream(file_path, prompt)
+    else:
+        yield transcribe_media(file_path, prompt)
+
+AUDIO_TRANSCRIPTION_PROMPT = "Generate transcription from the audio, only extract speech and ignore background audio."
+VIDEO_TRANSCRIPTION_PROMPT = "Generate transcription from the video, only extract speech and ignore background audio."
 
-# Function to upload video file to Gemini API
+# Function to stream transcription from an audio file
+def stream_transcription(file_path):
+    return stream_media_transcription(file_path, AUDIO_TRANSCRIPTION_PROMPT)
+
+# Function to generate transcription from an audio file
+def generate_transcription(file_path):
+    transcription = NO_TRANSCRIPTION
+    for transcription in stream_transcription(file_path):
+        pass
+    return transcription
+
+# Function to upload video file to Gemini API, reusing the remote file for content seen before
 def upload_video_file(file_path):
+    from media_uploads import get_upload_manager
     try:
-        return genai.upload_file(path=file_path)
+        return get_upload_manager().upload(file_path)
     except Exception as e:
         raise Exception(f"Failed to upload file: {e}")
 
+# Function to stream transcription from a video file; only its speech audio is uploaded when possible
+def stream_video_transcription(file_path):
+    from media_uploads import get_upload_manager, file_sha256
+    from media_tools import speech_audio
+    uploads = get_upload_manager()
+    video_hash = file_sha256(file_path)
+    cache_prompt = VIDEO_TRANSCRIPTION_PROMPT + "|speech-audio"
+    cached = uploads.get_transcription(video_hash, cache_prompt, 'gemini-1.5-flash')
+    if cached is not None:
+        yield cached
+        return
+    transcription = None
+    with speech_audio(file_path) as (media_path, audio_only):
+        prompt = AUDIO_TRANSCRIPTION_PROMPT if audio_only else VIDEO_TRANSCRIPTION_PROMPT
+        for transcription in stream_media_transcription(media_path, prompt):
+            yield transcription
+    if transcription and transcription != NO_TRANSCRIPTION:
+        uploads.put_transcription(video_hash, cache_prompt, 'gemini-1.5-flash', transcription)
+
 # Function to generate transcription from a video file
 def generate_video_transcription(file_path):
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    video_file = upload_video_file(file_path)
-    prompt = "Generate transcription from the video, only extract speech and ignore background audio."
-    response = model.generate_content([prompt, video_file])
-    if response.parts:
-        transcription = ''.join(part.text for part in response.parts)
-        return transcription
-    else:
-        return "No transcription available."
+    transcription = NO_TRANSCRIPTION
+    for transcription in stream_video_transcription(file_path):
+        pass
+    return transcription
 
 # Function to embed text content using Google Generative AI
 def embed_text(content):
+    from embedding_cache import get_embedding_cache
+    # The title changes the vector, so it is part of the cache's task label
+    title = "Embedding of single string"
+    cache = get_embedding_cache()
+    cache_task = f"retrieval_document/{title}"
+    cached = cache.get_many("models/embedding-001", cache_task, [content])[0]
+    if cached is not None:
+        return {"embedding": cached.tolist()}
     result = genai.embed_content(
         model="models/embedding-001",
         content=content,
         task_type="retrieval_document",
-        title="Embedding of single string"
+        title=title
     )
+    cache.put_many("models/embedding-001", cache_task, [content], [result["embedding"]])
     return result
 
 # Function to extract text from PDF files
 def get_pdf_text(pdf_docs):
-    text = ""
-    for pdf in pdf_docs:
-        pdf_reader = PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
+    from pdf_extract import iter_pdf_pages
+    return "".join(text for pdf in pdf_docs for _, text in iter_pdf_pages(pdf))
 
 # Function to split text into chunks
 def get_text_chunks(text):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
     chunks = text_splitter.split_text(text)
     return chunks
 
-# Function to create and save a vector store from text chunks
-def get_vector_store(text_chunks):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-    vector_store.save_local("faiss_index")
+# Function to add text chunks as one document to a namespaced vector store
+def get_vector_store(text_chunks, namespace=DEFAULT_NAMESPACE, doc_id=None, name=None):
+    from vector_store import DocumentStore, document_id
+    store = DocumentStore(namespace)
+    store.add_document(doc_id or document_id("\n".join(text_chunks)), text_chunks, name=name)
+    return store
 
-# Function to get the conversational chain
-def get_conversational_chain():
-    prompt_template = """
+# Prompt used to answer questions from the PDF context
+QA_PROMPT_TEMPLATE = """
         You are an expert assistant with deep knowledge in various domains. When answering the question, provide comprehensive and detailed information based on the given context. 
 
         Instructions:
@@ -133,16 +189,45 @@ def get_conversational_chain():
 
         Detailed Answer:
     """
-    model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
-    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    chain = load_qa_chain(model, chain_type="stuff", prompt=prompt)
-    return chain
-
-# Asynchronous function to handle user input and get the response
-async def user_input(user_question):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    new_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-    docs = new_db.similarity_search(user_question)
-    chain = get_conversational_chain()
-    response = await chain.acall({"input_documents": docs, "question": user_question}, return_only_outputs=True)
-    return response["output_text"]
+
+# Function to embed a question once and look it up in the answer cache
+def lookup_cached_answer(store, user_question):
+    from answer_cache import get_answer_cache
+    index_version = (store.path, store.version())
+    query_vector = store.registry.embeddings.embed_query(user_question)
+    return index_version, query_vector, get_answer_cache().get(index_version, user_question, query_vector)
+
+# Function to retrieve the chunks for a question and fit them into the prompt's token budget
+def retrieve_context(store, user_question, query_vector):
+    from context_builder import build_context, CONTEXT_CANDIDATES
+    docs = store.hybrid_search(user_question, k=CONTEXT_CANDIDATES, embedding=query_vector)
+    # Chunk vectors are read back from the index, so this makes no API calls
+    doc_vectors = store.vectors([doc.metadata["chunk_id"] for doc in docs]) if docs else []
+    return build_context(query_vector, docs, doc_vectors)
+
+# Function to stream the answer to a PDF question as it is generated
+def stream_user_input(user_question, namespace=DEFAULT_NAMESPACE):
+    from langchain.prompts import PromptTemplate
+    from vector_store import DocumentStore
+    from answer_cache import get_answer_cache
+    store = DocumentStore(namespace)
+    index_version, query_vector, cached = lookup_cached_answer(store, user_question)
+    if cached is not None:
+        yield cached
+        return
+    started = time.perf_counter()
+    docs = retrieve_context(store, user_question, query_vector)
+    context = "\n\n".join(doc.page_content for doc in docs)
+    prompt = PromptTemplate(template=QA_PROMPT_TEMPLATE, input_variables=["context", "question"])
+    model = models.get_chat_model("gemini-pro", temperature=0.3)
+    pieces = []
+    with models.timed("gemini-pro"):
+        for chunk in model.stream(prompt.format(context=context, question=user_question)):
+            pieces.append(chunk.content)
+            yield chunk.content
+    get_answer_cache().put(index_version, user_question, "".join(pieces), query_vector, time.perf_counter() - started)
+
+# Asynchronous function to handle user input and get the whole response; shares the streaming path
+async def user_input(user_question, namespace=DEFAULT_NAMESPACE):
+    import asyncio
+    return await asyncio.to_thread(lambda: "".join(stream_user_input(user_question, namespace)))
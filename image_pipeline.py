@@ -0,0 +1,68 @@
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+
+# Longest edge sent to the model; larger photos are downscaled before upload
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+IMAGE_QUALITY = 85
+# Processed images kept in memory, bounded by payload plus decoded pixel size
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ProcessedImage:
+    """A decoded, downscaled image and the re-encoded payload that is sent to Gemini."""
+
+    def __init__(self, image, data, mime_type):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+
+    def as_part(self):
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    # Approximate memory held: the encoded payload plus the decoded pixels
+    @property
+    def nbytes(self):
+        return len(self.data) + self.image.width * self.image.height * len(self.image.getbands())
+
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+# Function to decode, orient, downscale and re-encode an image without its metadata
+def process_image(data, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_QUALITY):
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    # WebP keeps transparency and is far smaller than PNG or full-quality JPEG; no EXIF is written
+    out = io.BytesIO()
+    image.save(out, format="WEBP", quality=quality, method=4)
+    return ProcessedImage(image, out.getvalue(), "image/webp")
+
+
+# Function to get the processed version of an image, cached by content hash and settings
+def get_processed_image(data, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_QUALITY):
+    global _cache_bytes
+    key = (hashlib.sha256(data).hexdigest(), max_edge, quality)
+    with _cache_lock:
+        processed = _cache.get(key)
+        if processed is not None:
+            _cache.move_to_end(key)
+            return processed
+    processed = process_image(data, max_edge, quality)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = processed
+            _cache_bytes += processed.nbytes
+            while _cache_bytes > IMAGE_CACHE_BYTES and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= evicted.nbytes
+    return processed
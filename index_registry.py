@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import OrderedDict
+from langchain_community.vectorstores import FAISS
+from embedding_engine import BatchedEmbeddings
+
+# Files written by FAISS.save_local; together they identify one index version
+INDEX_FILES = ("index.faiss", "index.pkl")
+# Loaded indexes kept in memory; the least recently used one is dropped beyond this
+INDEX_REGISTRY_MAX_ENTRIES = int(os.getenv("INDEX_REGISTRY_MAX_ENTRIES", "16"))
+
+
+# Function to compute the version stamp of an index directory from its files
+def index_version(path, files=INDEX_FILES):
+    stamp = []
+    for name in files:
+        try:
+            stat = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            return None
+        stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+class IndexRegistry:
+    """Keeps each FAISS index loaded once per process and reloads it only when its files change."""
+
+    def __init__(self, embeddings=None, max_entries=INDEX_REGISTRY_MAX_ENTRIES):
+        self.embeddings = embeddings or BatchedEmbeddings(model="models/embedding-001")
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    def _path_lock(self, path):
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    # The loader builds the index from its directory; by default the directory holds one FAISS.save_local
+    def get(self, path="faiss_index", loader=None, files=INDEX_FILES):
+        path = os.path.abspath(path)
+        version = index_version(path, files)
+        if version is None:
+            raise FileNotFoundError(f"No FAISS index found at {path}")
+        entry = self._indexes.get(path)
+        if entry and entry[0] == version:
+            self._touch(path)
+            return entry[1]
+        # Only one thread deserializes a given index; the others wait and reuse it
+        with self._path_lock(path):
+            entry = self._indexes.get(path)
+            if entry and entry[0] == version:
+                return entry[1]
+            if loader is None:
+                index = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            else:
+                index = loader(path)
+            self._store(path, version, index)
+            return index
+
+    def version(self, path="faiss_index", files=INDEX_FILES):
+        return index_version(os.path.abspath(path), files)
+
+    # Function to put an index that was just built in memory, avoiding a reload from disk
+    def put(self, path, index, files=INDEX_FILES):
+        path = os.path.abspath(path)
+        with self._path_lock(path):
+            self._store(path, index_version(path, files), index)
+
+    def _touch(self, path):
+        with self._lock:
+            if path in self._indexes:
+                self._indexes.move_to_end(path)
+
+    def _store(self, path, version, index):
+        with self._lock:
+            self._indexes[path] = (version, index)
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(os.path.abspath(path), None)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+# Function to get the process-wide index registry shared by all Streamlit sessions
+def get_index_registry():
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = IndexRegistry()
+        return _default_registry
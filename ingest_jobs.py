@@ -0,0 +1,145 @@
+import io
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import sqlite3
+import threading
+from ingest_pipeline import IngestPipeline
+
+# Job state and the uploaded PDFs of unfinished jobs live here, so jobs survive a restart
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", "ingest_jobs")
+# Jobs that run at the same time; each one already parallelizes parsing and embedding
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobQueue:
+    """Runs ingest jobs on a pool of background workers and keeps their state in SQLite."""
+
+    def __init__(self, jobs_dir=INGEST_JOBS_DIR, workers=INGEST_JOB_WORKERS):
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.jobs_dir = jobs_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(jobs_dir, "jobs.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, namespace TEXT NOT NULL, state TEXT NOT NULL, names TEXT NOT NULL, "
+            "progress TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._pending = queue.Queue()
+        # Jobs cut short by a restart start over; documents they already committed are skipped
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id FROM jobs WHERE state IN (?, ?) ORDER BY created", ACTIVE_STATES
+            ).fetchall()
+        for (job_id,) in rows:
+            self._update(job_id, state=QUEUED)
+            self._pending.put(job_id)
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    # Function to queue uploaded PDFs for ingestion into a namespace; returns the job ID at once
+    def submit(self, pdf_docs, namespace):
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        names = []
+        for position, pdf in enumerate(pdf_docs):
+            data = pdf.getvalue() if hasattr(pdf, "getvalue") else pdf
+            with open(os.path.join(job_dir, f"{position:04d}.pdf"), "wb") as fh:
+                fh.write(data)
+            names.append(getattr(pdf, "name", None))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, namespace, state, names, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, namespace, QUEUED, json.dumps(names), now, now),
+            )
+            self._db.commit()
+        self._pending.put(job_id)
+        return job_id
+
+    def _row_to_job(self, row):
+        job_id, namespace, state, names, progress, error, created, updated = row
+        return {
+            "job_id": job_id,
+            "namespace": namespace,
+            "state": state,
+            "names": json.loads(names),
+            "progress": json.loads(progress) if progress else None,
+            "error": error,
+            "created": created,
+            "updated": updated,
+        }
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    # Function to list the most recent jobs, optionally for one namespace
+    def jobs(self, namespace=None, limit=20):
+        query = "SELECT * FROM jobs"
+        params = ()
+        if namespace is not None:
+            query += " WHERE namespace = ?"
+            params = (namespace,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def _load_pdfs(self, job_id, names):
+        pdfs = []
+        for position, name in enumerate(names):
+            with open(os.path.join(self._job_dir(job_id), f"{position:04d}.pdf"), "rb") as fh:
+                pdf = io.BytesIO(fh.read())
+            pdf.name = name
+            pdfs.append(pdf)
+        return pdfs
+
+    def _work(self):
+        while True:
+            job_id = self._pending.get()
+            job = self.get(job_id)
+            if job is None or job["state"] not in ACTIVE_STATES:
+                continue
+            self._update(job_id, state=RUNNING)
+            try:
+                pipeline = IngestPipeline(job["namespace"], on_progress=lambda progress: self._update(
+                    job_id, progress=json.dumps(progress)))
+                progress = pipeline.run(self._load_pdfs(job_id, job["names"]), PROGRESS_INTERVAL_SECONDS)
+                self._update(job_id, state=DONE, progress=json.dumps(progress))
+            except Exception as e:
+                self._update(job_id, state=FAILED, error=str(e))
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+# Function to get the process-wide job queue; its workers start on first use
+def get_job_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
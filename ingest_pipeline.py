@@ -0,0 +1,279 @@
+import time
+import queue
+import threading
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from embedding_engine import AdaptiveLimiter, embed_texts, EMBEDDING_BATCH_SIZE
+from pdf_extract import iter_pdf_pages
+from vector_store import DocumentStore, DEFAULT_NAMESPACE, document_id
+
+# Same chunking as get_text_chunks in gemini_utility.py
+CHUNK_SIZE = 10000
+CHUNK_OVERLAP = 1000
+QUEUE_SIZE = 64
+EMBED_WORKERS = 4
+# Finished documents are committed to the store together, once this many chunks or seconds have accumulated
+INDEX_COMMIT_CHUNKS = 2000
+INDEX_COMMIT_SECONDS = 5.0
+
+_STOP = object()
+
+
+class StageMetrics:
+    """Counters for one pipeline stage; blocked time on put is the backpressure signal."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.waiting_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_s": round(self.busy_seconds, 3),
+            "waiting_s": round(self.waiting_seconds, 3),
+            "blocked_s": round(self.blocked_seconds, 3),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class IngestPipeline:
+    """Streams PDFs through parse -> chunk -> embed -> index with bounded queues between the stages."""
+
+    def __init__(self, namespace=DEFAULT_NAMESPACE, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                 queue_size=QUEUE_SIZE, embed_workers=EMBED_WORKERS, batch_size=EMBEDDING_BATCH_SIZE,
+                 on_progress=None):
+        self.store = DocumentStore(namespace)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.chunk_size = chunk_size
+        self.embed_workers = embed_workers
+        self.batch_size = batch_size
+        # One limiter for every embed worker, so throttling seen by one slows them all down
+        self.limiter = AdaptiveLimiter(embed_workers)
+        self.on_progress = on_progress
+        self.pages = queue.Queue(queue_size)
+        self.chunks = queue.Queue(queue_size)
+        self.vectors = queue.Queue(queue_size)
+        self.metrics = {name: StageMetrics(name) for name in ("parse", "chunk", "embed", "index")}
+        self.documents_done = 0
+        self.documents_total = 0
+        self._abort = threading.Event()
+        self._errors = []
+        self._metrics_lock = threading.Lock()
+
+    def _put(self, q, item, stage):
+        start = time.perf_counter()
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        with self._metrics_lock:
+            metrics = self.metrics[stage]
+            metrics.blocked_seconds += time.perf_counter() - start
+            metrics.max_queue_depth = max(metrics.max_queue_depth, q.qsize())
+
+    # Function to take the next item of a queue; returns None if timeout seconds pass first
+    def _get(self, q, stage, timeout=None):
+        start = time.perf_counter()
+        while not self._abort.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if timeout is not None and time.perf_counter() - start >= timeout:
+                    return None
+                continue
+        else:
+            return _STOP
+        with self._metrics_lock:
+            self.metrics[stage].waiting_seconds += time.perf_counter() - start
+        return item
+
+    def _busy(self, stage, started, items=1):
+        with self._metrics_lock:
+            self.metrics[stage].busy_seconds += time.perf_counter() - started
+            self.metrics[stage].items += items
+
+    def _run_stage(self, target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._abort.set()
+
+    def _report(self):
+        if self.on_progress:
+            self.on_progress(self.progress())
+
+    def progress(self):
+        with self._metrics_lock:
+            return {
+                "documents_done": self.documents_done,
+                "documents_total": self.documents_total,
+                "queues": {"pages": self.pages.qsize(), "chunks": self.chunks.qsize(), "vectors": self.vectors.qsize()},
+                "stages": [metrics.as_dict() for metrics in self.metrics.values()],
+            }
+
+    # Stage 1: stream page texts out of every PDF
+    def _parse(self, documents):
+        for doc_id, name, pdf in documents:
+            self._put(self.pages, ("begin", doc_id, name), "parse")
+            started = time.perf_counter()
+            for _, text in iter_pdf_pages(pdf):
+                self._busy("parse", started)
+                self._put(self.pages, ("page", doc_id, text), "parse")
+                started = time.perf_counter()
+            self._put(self.pages, ("end", doc_id, None), "parse")
+        self._put(self.pages, _STOP, "parse")
+
+    # Stage 2: split the running text into chunks as soon as enough pages have arrived
+    def _chunk(self):
+        buffer, position, name = "", 0, None
+        while True:
+            item = self._get(self.pages, "chunk")
+            if item is _STOP:
+                break
+            kind, doc_id, payload = item
+            started = time.perf_counter()
+            if kind == "begin":
+                buffer, position, name = "", 0, payload
+                continue
+            if kind == "page":
+                buffer += payload
+                if len(buffer) < 2 * self.chunk_size:
+                    continue
+                # Keep the last piece back; it may still grow with the next page
+                pieces = self.splitter.split_text(buffer)
+                ready, buffer = pieces[:-1], pieces[-1]
+            else:
+                ready, buffer = (self.splitter.split_text(buffer) if buffer else []), ""
+            self._busy("chunk", started, len(ready))
+            for text in ready:
+                self._put(self.chunks, ("chunk", doc_id, (position, text)), "chunk")
+                position += 1
+            if kind == "end":
+                self._put(self.chunks, ("end", doc_id, (position, name)), "chunk")
+        for _ in range(self.embed_workers):
+            self._put(self.chunks, _STOP, "chunk")
+
+    # Stage 3: embed chunks in batches; several workers keep requests in flight
+    def _embed(self):
+        while True:
+            item = self._get(self.chunks, "embed")
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size and batch[-1] is not _STOP and batch[-1][0] == "chunk":
+                try:
+                    batch.append(self.chunks.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            chunks = [entry for entry in batch if entry[0] == "chunk"]
+            if chunks:
+                started = time.perf_counter()
+                matrix = embed_texts([payload[1] for _, _, payload in chunks], max_workers=1, limiter=self.limiter)
+                self._busy("embed", started, len(chunks))
+                for (_, doc_id, (position, text)), vector in zip(chunks, matrix):
+                    self._put(self.vectors, ("vector", doc_id, (position, text, vector)), "embed")
+            for entry in batch:
+                if entry[0] == "end":
+                    self._put(self.vectors, entry, "embed")
+            if stop:
+                break
+        self._put(self.vectors, _STOP, "embed")
+
+    # Function to add the finished documents to the store as one snapshot
+    def _commit(self, finished):
+        if not finished:
+            return
+        started = time.perf_counter()
+        self.store.add_documents(finished)
+        self._busy("index", started, len(finished))
+        with self._metrics_lock:
+            self.documents_done += len(finished)
+        finished.clear()
+
+    # Stage 4: collect vectors and commit finished documents in batches; every commit writes a snapshot and
+    # holds the collection's lock, so a many-PDF upload commits a few times instead of once per PDF
+    def _index(self):
+        pending = {}
+        finished = []
+        finished_chunks = 0
+        first_finished = None
+        stops = 0
+        while stops < self.embed_workers:
+            timeout = None if first_finished is None else max(0.0, first_finished + INDEX_COMMIT_SECONDS - time.perf_counter())
+            item = self._get(self.vectors, "index", timeout)
+            if item is _STOP:
+                if self._abort.is_set():
+                    break
+                stops += 1
+                continue
+            if item is not None:
+                kind, doc_id, payload = item
+                doc = pending.setdefault(doc_id, {"rows": {}, "total": None, "name": None})
+                if kind == "vector":
+                    position, text, vector = payload
+                    doc["rows"][position] = (text, vector)
+                else:
+                    doc["total"], doc["name"] = payload
+                if doc["total"] is not None and len(doc["rows"]) == doc["total"]:
+                    rows = [doc["rows"][position] for position in range(doc["total"])]
+                    del pending[doc_id]
+                    if rows:
+                        finished.append((doc_id, [text for text, _ in rows], doc["name"], [vector for _, vector in rows]))
+                        finished_chunks += len(rows)
+                        first_finished = first_finished or time.perf_counter()
+                    else:
+                        with self._metrics_lock:
+                            self.documents_done += 1
+            if finished and (item is None or finished_chunks >= INDEX_COMMIT_CHUNKS
+                             or time.perf_counter() - first_finished >= INDEX_COMMIT_SECONDS):
+                self._commit(finished)
+                finished_chunks, first_finished = 0, None
+        # Documents that were complete when the pipeline stopped are still committed
+        self._commit(finished)
+
+    # Function to ingest uploaded PDFs; documents already in the store are skipped.
+    # on_progress is only called from the calling thread, so it may update Streamlit widgets.
+    def run(self, pdf_docs, progress_interval=0.5):
+        documents = {}
+        for pdf in pdf_docs:
+            data = pdf.getvalue() if hasattr(pdf, "getvalue") else pdf
+            doc_id = document_id(data)
+            if doc_id not in documents and not self.store.has_document(doc_id):
+                documents[doc_id] = (doc_id, getattr(pdf, "name", None), data)
+        documents = list(documents.values())
+        self.documents_total = len(documents)
+        if not documents:
+            self._report()
+            return self.progress()
+
+        threads = [threading.Thread(target=self._run_stage, args=(self._parse, documents), daemon=True),
+                   threading.Thread(target=self._run_stage, args=(self._chunk,), daemon=True),
+                   threading.Thread(target=self._run_stage, args=(self._index,), daemon=True)]
+        threads += [threading.Thread(target=self._run_stage, args=(self._embed,), daemon=True)
+                    for _ in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            threads[2].join(progress_interval)
+            self._report()
+            if not threads[2].is_alive():
+                self._abort.set()
+        if self._errors:
+            raise self._errors[0]
+        return self.progress()
+
+
+# Function to ingest PDFs into a namespace with the streaming pipeline
+def ingest_pdfs(pdf_docs, namespace=DEFAULT_NAMESPACE, on_progress=None):
+    return IngestPipeline(namespace, on_progress=on_progress).run(pdf_docs)
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import math
+import heapq
+import numpy as np
+from collections import Counter
+
+# Okapi BM25 parameters, and the constant of reciprocal rank fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+# Candidates taken from each retriever before fusion
+HYBRID_FETCH_K = 20
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the this to was what when
+where which who why will with you your do does did can could should would about into than then there these
+those they them we our us me my
+""".split())
+
+
+# Function to split text into lowercase word tokens without stopwords
+def tokenize(text):
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+class KeywordIndex:
+    """An in-memory inverted index of chunks scored with BM25."""
+
+    def __init__(self):
+        self._terms = {}
+        self._postings = {}
+        self._lengths = {}
+        self._total_length = 0
+
+    @classmethod
+    def from_texts(cls, texts, ids):
+        index = cls()
+        for cid, text in zip(ids, texts):
+            index.add(cid, text)
+        return index
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, cid):
+        return cid in self._terms
+
+    def _add_terms(self, cid, terms):
+        self._terms[cid] = terms
+        self._lengths[cid] = sum(terms.values())
+        self._total_length += self._lengths[cid]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[cid] = tf
+
+    def add(self, cid, text):
+        if cid in self._terms:
+            self.remove([cid])
+        self._add_terms(cid, dict(Counter(tokenize(text))))
+
+    # Function to take over every chunk of another index, e.g. one loaded from a store segment
+    def update(self, other):
+        for cid, terms in other._terms.items():
+            if cid in self._terms:
+                self.remove([cid])
+            self._add_terms(cid, dict(terms))
+
+    def remove(self, chunk_ids):
+        for cid in chunk_ids:
+            terms = self._terms.pop(cid, None)
+            if terms is None:
+                continue
+            self._total_length -= self._lengths.pop(cid)
+            for term in terms:
+                posting = self._postings[term]
+                del posting[cid]
+                if not posting:
+                    del self._postings[term]
+
+    # Function to rank chunk IDs by BM25 score for a query
+    def search(self, query, k=HYBRID_FETCH_K, exclude=()):
+        n = len(self._terms)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for cid, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[cid] / avg_length)
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        if exclude:
+            scores = {cid: score for cid, score in scores.items() if cid not in exclude}
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    # Only term frequencies are stored; postings are rebuilt on load
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._terms, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path) as fh:
+            for cid, terms in json.load(fh).items():
+                index._add_terms(cid, terms)
+        return index
+
+
+# Function to merge several rankings of IDs, best first, by reciprocal rank fusion
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+# Function to retrieve chunks from a LangChain FAISS store and its keyword index, fused by rank
+def hybrid_search(vector_store, keyword_index, query, k=4, embedding=None, fetch_k=HYBRID_FETCH_K, exclude=()):
+    if embedding is None:
+        embedding = vector_store.embeddings.embed_query(query)
+    exclude = set(exclude)
+    # Excluded chunks may still sit in the vector index, so fetch enough to make up for them
+    vector_k = min(fetch_k + len(exclude), vector_store.index.ntotal)
+    vector_ids = []
+    if vector_k:
+        _, rows = vector_store.index.search(np.asarray([embedding], dtype=np.float32), vector_k)
+        vector_ids = [vector_store.index_to_docstore_id[row] for row in rows[0] if row != -1]
+        vector_ids = [cid for cid in vector_ids if cid not in exclude][:fetch_k]
+    keyword_ids = [cid for cid, _ in keyword_index.search(query, fetch_k, exclude)] if keyword_index is not None else []
+    fused = reciprocal_rank_fusion([vector_ids, keyword_ids])[:k]
+    return [vector_store.docstore.search(cid) for cid in fused]
@@ -1,27 +1,11 @@
 import streamlit as st
-from PIL import Image
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
+import uuid
 from dotenv import load_dotenv
-import asyncio
 from streamlit_option_menu import option_menu
-from gemini_utility import load_gemini_pro_model, get_gemini_response, embed_text, get_pdf_text, get_text_chunks, get_vector_store, user_input
-from gemini_utility import upload_audio_file, generate_transcription
-
-from gemini_utility import load_gemini_pro_model, generate_video_transcription
-import tempfile
-from gemini_utility import input_image_setup
-from playsound import playsound
-# Import additional libraries for voice assistance
-import speech_recognition as sr
-from gtts import gTTS
+from session_cache import get_session_cache, upload_key
+# Each page imports its own dependencies below: Streamlit re-runs this script on every interaction,
+# and a cold start should only load the subsystems of the page that is open
 # import pyaudio
 
 # Load environment variables from .env file
@@ -43,42 +27,87 @@ with st.sidebar:
         default_index=0
     )
 
+# Per-upload artifacts (processed images, transcriptions) survive reruns for this session
+session_cache = get_session_cache(st.session_state)
+
+# Process-wide caches are shared by every session, so clearing them is an operator action
+ADMIN_TOOLS = os.getenv("GEMINI_ADMIN_TOOLS", "0") == "1"
+
+with st.sidebar:
+    with st.expander("Cached data"):
+        st.json(session_cache.stats())
+        if st.button("Clear my cached data"):
+            session_cache.invalidate()
+        if ADMIN_TOOLS and st.button("Clear shared caches (all users)"):
+            from vector_store import clear_loaded_indexes
+            st.cache_resource.clear()
+            clear_loaded_indexes()
+
+# Function to get the document store of a collection, shared by every session and rerun
+@st.cache_resource(max_entries=64)
+def get_document_store(namespace):
+    from vector_store import DocumentStore
+    return DocumentStore(namespace)
+
+# Function to delete idle per-session collections; runs at most once an hour per process
+@st.cache_resource(ttl=3600)
+def remove_idle_session_collections():
+    from vector_store import remove_idle_namespaces
+    return remove_idle_namespaces()
+
+# Function to add the sentences synthesized so far to the page, in order
+def show_ready_audio(speech, area):
+    for clip in speech.ready():
+        # Only the first clip starts by itself, unless the server's speakers already play it;
+        # browsers would play several autoplaying clips over each other
+        area.audio(clip, format="audio/mp3", autoplay=not speech.local_playback and speech.first_audio_seconds is None)
+        speech.audio_started()
+
 # Function to translate user roles for Streamlit chat display
 def translate_role_for_streamlit(user_role):
     return "assistant" if user_role == "model" else user_role
 
 # ChatBot section
 if selected == "ChatBot":
-    model = load_gemini_pro_model()
+    from conversation_memory import ConversationMemory, CHAT_DISPLAY_TURNS
 
-    # Initialize chat session in Streamlit if not already present
-    if "chat_session" not in st.session_state:
-        st.session_state.chat_session = model.start_chat(history=[])
+    # Initialize conversation memory in Streamlit if not already present; only recent turns and a summary are sent
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = ConversationMemory("gemini-pro")
+        st.session_state.chat_display_turns = CHAT_DISPLAY_TURNS
+    memory = st.session_state.chat_memory
 
     st.title("ChatBot")
-    # Display the chat history
-    for message in st.session_state.chat_session.history:
-        with st.chat_message(translate_role_for_streamlit(message.role)):
-            st.markdown(message.parts[0].text)
+    # Display the most recent turns; earlier ones are rendered only on request
+    hidden = len(memory.turns) - st.session_state.chat_display_turns
+    if hidden > 0 and st.button(f"Show earlier messages ({hidden})"):
+        st.session_state.chat_display_turns += CHAT_DISPLAY_TURNS
+        st.rerun()
+    for role, text in memory.turns[-st.session_state.chat_display_turns:]:
+        with st.chat_message(translate_role_for_streamlit(role)):
+            st.markdown(text)
 
     # Input field for user's message
     user_prompt = st.chat_input("Ask Gemini-Pro...")
     if user_prompt:
         st.chat_message("user").markdown(user_prompt)
-        gemini_response = st.session_state.chat_session.send_message(user_prompt)
-
-        # Display Gemini-Pro response
+        # Display Gemini-Pro response as it streams in
         with st.chat_message("assistant"):
-            st.markdown(gemini_response.text)
+            st.write_stream(memory.send(user_prompt))
 
 # Image Captioning section
 elif selected == "Image Captioning":
+    from gemini_utility import get_gemini_response, input_image_setup
+    from image_pipeline import get_processed_image
+
     st.title("Gemini Image Captioning")
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
     
     image = ""
     if uploaded_file is not None:
-        image = Image.open(uploaded_file)
+        # Decoded and downscaled once per upload; reruns reuse the result
+        processed = session_cache.get_or_create("image", upload_key(uploaded_file), lambda: get_processed_image(uploaded_file.getvalue()))
+        image = processed.image
         st.image(image, caption="Uploaded Image.", use_column_width=True)
 
     input = st.text_input("Input Prompt: ", key="input")
@@ -108,6 +137,7 @@ elif selected == "Image Captioning":
 
     # If submit button is clicked
     if submit:
+        # Served from the processed-image cache filled when the upload was displayed
         image_data = input_image_setup(uploaded_file)
         response = get_gemini_response(input_prompt, image_data, input)
         st.subheader("The Response is")
@@ -115,6 +145,8 @@ elif selected == "Image Captioning":
 
 # Embed Text section
 elif selected == "Embed Text":
+    from gemini_utility import embed_text
+
     st.title("Embed Text")
     text_to_embed = st.text_area("Enter text to embed:")
 
@@ -126,26 +158,80 @@ elif selected == "Embed Text":
 
 # Chat with PDF section
 elif selected == "Chat with PDF":
+    from gemini_utility import stream_user_input
+    from ingest_jobs import get_job_queue, ACTIVE_STATES, DONE
+    from answer_cache import get_answer_cache
+    from vector_store import DEFAULT_NAMESPACE, SESSION_NAMESPACE_PREFIX
+
     st.title("Chat with PDF using Gemini💁")
 
+    remove_idle_session_collections()
+
+    # Sessions share the default collection; a private one is opt-in and expires once idle
+    if "namespace" not in st.session_state:
+        st.session_state.namespace = st.query_params.get("collection") or DEFAULT_NAMESPACE
+    with st.sidebar:
+        st.button("New private collection", on_click=lambda: st.session_state.update(namespace=f"{SESSION_NAMESPACE_PREFIX}{uuid.uuid4().hex[:8]}"))
+        namespace = st.text_input("Collection", key="namespace")
+    # Keep the collection in the URL so a browser refresh comes back to it and its running ingest jobs
+    st.query_params["collection"] = namespace
+    store = get_document_store(namespace)
+    job_queue = get_job_queue()
+
+    # Function to show one ingest job's progress; only this fragment re-runs while it polls
+    @st.fragment(run_every=1.0)
+    def show_ingest_progress(job_id):
+        job = job_queue.get(job_id)
+        progress = job["progress"] or {}
+        if progress.get("documents_total"):
+            st.progress(progress["documents_done"] / progress["documents_total"])
+        stages = " · ".join(f"{stage['stage']}: {stage['items']}" for stage in progress.get("stages", []))
+        st.caption(f"{', '.join(name or 'PDF' for name in job['names'])}: {job['state']}" + (f" · {stages}" if stages else ""))
+        if job["state"] not in ACTIVE_STATES:
+            # Refresh the whole page so the new documents show up
+            st.rerun()
+
     user_question = st.text_input("Ask a Question from the PDF Files")
 
     if user_question:
-        response = asyncio.run(user_input(user_question))
-        st.write("Reply:", response)
+        st.write("Reply:")
+        st.write_stream(stream_user_input(user_question, namespace))
 
     with st.sidebar:
         st.title("Menu:")
         pdf_docs = st.file_uploader("Upload your PDF Files and Click on the Submit & Process Button", accept_multiple_files=True)
-        if st.button("Submit & Process"):
-            with st.spinner("Processing..."):
-                raw_text = get_pdf_text(pdf_docs)
-                text_chunks = get_text_chunks(raw_text)
-                get_vector_store(text_chunks)
+        if st.button("Submit & Process") and pdf_docs:
+            # Ingestion runs on background workers, so chat stays responsive; only new documents are embedded
+            st.session_state.ingest_job = job_queue.submit(pdf_docs, namespace)
+
+        for job in job_queue.jobs(namespace, limit=5):
+            if job["state"] in ACTIVE_STATES:
+                show_ingest_progress(job["job_id"])
+        last_job = job_queue.get(st.session_state["ingest_job"]) if "ingest_job" in st.session_state else None
+        if last_job and last_job["namespace"] == namespace and last_job["state"] not in ACTIVE_STATES:
+            if last_job["state"] == DONE:
                 st.success("Done")
+            else:
+                st.error(f"Processing failed: {last_job['error']}")
+
+        # Remove documents from the collection
+        documents = store.documents()
+        if documents:
+            to_remove = st.multiselect("Documents", list(documents), format_func=lambda doc_id: documents[doc_id]["name"] or doc_id)
+            if to_remove and st.button("Remove Selected"):
+                for doc_id in to_remove:
+                    store.delete_document(doc_id)
+                st.success("Removed")
+
+        with st.expander("Answer cache"):
+            st.json(get_answer_cache().stats())
 
 # Voice Assistant section
 elif selected == "Voice Assistant":
+    import speech_recognition as sr
+    from gemini_utility import load_gemini_pro_model
+    from speech_synthesis import SpeechPipeline
+
     st.title("Gemini AI Voice Assistant")
     st.write("Click the button below and speak to get a response from Gemini.")
 
@@ -160,20 +246,25 @@ elif selected == "Voice Assistant":
             text = r.recognize_google(audio)
             st.write(f"You said: {text}")
 
-            # Generate content using the generative model
+            # Stream the response; each finished sentence is synthesized and sent to the page while the rest arrives
             model = load_gemini_pro_model()
-            response = model.generate_content(text)
-            response_text = response.text
-            st.write(f"Gemini response: {response_text}")
-
-            # Convert the response text to speech
-            tts = gTTS(response_text, lang='en')
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-                tts.save(fp.name)
-                audio_file = fp.name
-
-            # Play the generated speech audio using playsound
-            st.audio(audio_file)
+            response = model.generate_content(text, stream=True)
+            speech = SpeechPipeline(lang='en')
+            response_placeholder = st.empty()
+            sentence_audio = st.container()
+            response_text = ""
+            for chunk in response:
+                response_text += chunk.text
+                response_placeholder.write(f"Gemini response: {response_text}")
+                speech.feed(chunk.text)
+                show_ready_audio(speech, sentence_audio)
+
+            # The whole answer as one clip for replay; repeated phrases come from the phrase cache
+            whole_answer = speech.finish()
+            show_ready_audio(speech, sentence_audio)
+            st.audio(whole_answer, format="audio/mp3")
+            if speech.first_audio_seconds is not None:
+                st.caption(f"First audio after {speech.first_audio_seconds:.1f} s")
 
         except sr.UnknownValueError:
             st.write("Sorry, I could not understand the audio.")
@@ -184,50 +275,58 @@ elif selected == "Voice Assistant":
 
 # Transcribe Audio section
 elif selected == "Transcribe Audio":
+    from gemini_utility import stream_transcription
+    from media_uploads import temporary_upload
+
     st.title("Transcribe Audio")
     uploaded_file = st.file_uploader("Choose an MP3 file...", type=["mp3"])
 
     if uploaded_file is not None:
         with st.spinner("Transcribing..."):
             try:
-                # Save the uploaded file to a temporary location
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                    temp_file.write(uploaded_file.read())
-                    file_path = temp_file.name
-
                 # Play the uploaded audio file
-                st.audio(file_path)
-
-                # Upload the audio file and generate transcription
-                transcription = generate_transcription(file_path)
+                st.audio(uploaded_file)
 
                 st.subheader("Transcription")
-                st.write(transcription)
+                placeholder = st.empty()
+                transcription = session_cache.get("transcription", upload_key(uploaded_file))
+                if transcription is None:
+                    # Save the upload to a temporary file that is removed afterwards; repeat files reuse the upload
+                    with temporary_upload(uploaded_file, ".mp3") as file_path:
+                        # Long recordings are transcribed in segments; show the text as it completes
+                        for transcription in stream_transcription(file_path):
+                            placeholder.markdown(transcription.replace("\n", "  \n"))
+                    session_cache.put("transcription", upload_key(uploaded_file), transcription)
+                placeholder.markdown(transcription.replace("\n", "  \n"))
 
             except Exception as e:
                 st.error(f"Error: {e}")
 
 # Transcribe Video section
 elif selected == "Transcribe Video":
+    from gemini_utility import stream_video_transcription
+    from media_uploads import temporary_upload
+
     st.title("Transcribe Video")
     uploaded_file = st.file_uploader("Choose a video file...", type=["mp4", "avi", "mov"])
 
     if uploaded_file is not None:
         with st.spinner("Processing..."):
             try:
-                # Save the uploaded file to a temporary location
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                    temp_file.write(uploaded_file.read())
-                    file_path = temp_file.name
-
                 # Play the uploaded video file
-                st.video(file_path)
-
-                # Upload the video file and generate transcription
-                transcription = generate_video_transcription(file_path)
+                st.video(uploaded_file)
 
                 st.subheader("Transcription")
-                st.write(transcription)
+                placeholder = st.empty()
+                transcription = session_cache.get("transcription", upload_key(uploaded_file))
+                if transcription is None:
+                    # Save the upload to a temporary file that is removed afterwards; repeat files reuse the upload
+                    with temporary_upload(uploaded_file, os.path.splitext(uploaded_file.name)[1] or ".mp4") as file_path:
+                        # Long recordings are transcribed in segments; show the text as it completes
+                        for transcription in stream_video_transcription(file_path):
+                            placeholder.markdown(transcription.replace("\n", "  \n"))
+                    session_cache.put("transcription", upload_key(uploaded_file), transcription)
+                placeholder.markdown(transcription.replace("\n", "  \n"))
 
             except Exception as e:
                 st.error(f"Error: {e}")
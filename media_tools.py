@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+# ffmpeg and ffprobe are looked up on PATH; media helpers degrade gracefully without them
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
+
+# Function to tell whether local media processing is available
+def ffmpeg_available():
+    return bool(FFMPEG and FFPROBE)
+
+
+# Function to read the container and stream information of a media file
+def probe(file_path):
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", file_path],
+        capture_output=True, check=True, text=True,
+    )
+    return json.loads(result.stdout)
+
+
+# Function to get the duration of a media file in seconds
+def media_duration(file_path):
+    return float(probe(file_path)["format"].get("duration") or 0.0)
+
+
+# Function to cut [start, start + duration) out of a media file without re-encoding
+def cut_segment(file_path, start, duration, output_path):
+    subprocess.run(
+        [FFMPEG, "-v", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}",
+         "-i", file_path, "-c", "copy", output_path],
+        check=True,
+    )
+    return output_path
+
+
+# Function to tell whether a media file has at least one audio stream
+def has_audio_stream(file_path):
+    return any(stream.get("codec_type") == "audio" for stream in probe(file_path).get("streams", []))
+
+
+# Speech-friendly encodings, tried in order: Opus is smallest, MP3 is the most widely built
+SPEECH_ENCODINGS = (
+    (".ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    (".mp3", ["-c:a", "libmp3lame", "-b:a", "32k"]),
+)
+
+
+# Function to demux the audio track and downmix it to 16 kHz mono speech audio
+def extract_speech_audio(file_path, output_dir):
+    base = os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0] + "-speech")
+    last_error = None
+    for suffix, codec in SPEECH_ENCODINGS:
+        output_path = base + suffix
+        try:
+            # bitexact keeps the output identical across runs, so content-hash caches still hit
+            subprocess.run(
+                [FFMPEG, "-v", "error", "-y", "-i", file_path, "-vn", "-sn", "-dn", "-map", "0:a:0",
+                 "-ac", "1", "-ar", "16000", *codec, "-map_metadata", "-1",
+                 "-fflags", "+bitexact", "-flags:a", "+bitexact", output_path],
+                check=True, capture_output=True,
+            )
+            return output_path
+        except subprocess.CalledProcessError as e:
+            last_error = e
+    raise last_error
+
+
+# Context manager yielding the file to transcribe: extracted speech audio, or the original file
+# when ffmpeg is missing, the file has no audio track, or extraction fails
+@contextmanager
+def speech_audio(file_path):
+    if not ffmpeg_available():
+        yield file_path, False
+        return
+    workdir = tempfile.mkdtemp(prefix="speech-")
+    try:
+        try:
+            audio_path = extract_speech_audio(file_path, workdir) if has_audio_stream(file_path) else None
+        except (subprocess.CalledProcessError, ValueError):
+            audio_path = None
+        yield (audio_path, True) if audio_path else (file_path, False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,121 @@
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import google.generativeai as genai
+
+# Remote handles and transcriptions are remembered here, keyed by file content hash
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+# Uploaded files live for 48 hours; stop reusing a handle a little before it expires
+UPLOAD_TTL_SECONDS = 47 * 3600
+EXPIRY_MARGIN_SECONDS = 600
+PROCESSING_POLL_SECONDS = 2
+
+
+# Function to hash a file's content without reading it into memory at once
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Context manager that saves an uploaded file to a temporary path and deletes it afterwards
+@contextmanager
+def temporary_upload(uploaded_file, suffix):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(uploaded_file.getvalue())
+        file_path = temp_file.name
+    try:
+        yield file_path
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+class UploadManager:
+    """Reuses Gemini file handles and transcriptions for media whose content was seen before."""
+
+    def __init__(self, cache_dir=MEDIA_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "media.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads (content_hash TEXT PRIMARY KEY, remote_name TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcriptions ("
+            "content_hash TEXT NOT NULL, prompt_hash TEXT NOT NULL, model TEXT NOT NULL, text TEXT NOT NULL, "
+            "PRIMARY KEY (content_hash, prompt_hash, model))"
+        )
+        self._db.commit()
+
+    def _remote_file(self, content_hash):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT remote_name, expires_at FROM uploads WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if not row or row[1] - EXPIRY_MARGIN_SECONDS < time.time():
+            return None
+        try:
+            remote = genai.get_file(row[0])
+        except Exception:
+            return None
+        return None if remote.state.name == "FAILED" else remote
+
+    # Function to upload a file once per content hash and hand back the remote handle
+    def upload(self, file_path, content_hash=None):
+        content_hash = content_hash or file_sha256(file_path)
+        remote = self._remote_file(content_hash)
+        if remote is None:
+            remote = genai.upload_file(path=file_path)
+            expiration = getattr(remote, "expiration_time", None)
+            expires_at = expiration.timestamp() if expiration else time.time() + UPLOAD_TTL_SECONDS
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO uploads (content_hash, remote_name, expires_at) VALUES (?, ?, ?)",
+                    (content_hash, remote.name, expires_at),
+                )
+                self._db.commit()
+        # Videos are processed server-side before they can be used in a prompt
+        while remote.state.name == "PROCESSING":
+            time.sleep(PROCESSING_POLL_SECONDS)
+            remote = genai.get_file(remote.name)
+        return remote
+
+    def get_transcription(self, content_hash, prompt, model):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM transcriptions WHERE content_hash = ? AND prompt_hash = ? AND model = ?",
+                (content_hash, prompt_hash, model),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_transcription(self, content_hash, prompt, model, text):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcriptions (content_hash, prompt_hash, model, text) VALUES (?, ?, ?, ?)",
+                (content_hash, prompt_hash, model, text),
+            )
+            self._db.commit()
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+# Function to get the process-wide upload manager
+def get_upload_manager():
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = UploadManager()
+        return _default_manager
@@ -0,0 +1,110 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+import google.generativeai as genai
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Models created and connected at process start when GEMINI_WARMUP is set
+WARMUP_MODELS = ("gemini-pro", "gemini-1.5-flash")
+
+
+class ModelStats:
+    """Call counter and latency histogram for one model."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds, error=False):
+        self.calls += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class ModelRegistry:
+    """Creates each model client once per (model, configuration) and keeps per-model call metrics."""
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, factory):
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = factory()
+                    self._models[key] = model
+        return model
+
+    # Function to get a shared google.generativeai model
+    def get_generative_model(self, model_name="gemini-pro", **config):
+        key = ("genai", model_name, tuple(sorted(config.items())))
+        return self._get(key, lambda: genai.GenerativeModel(model_name, **config))
+
+    # Function to get a shared LangChain chat model
+    def get_chat_model(self, model_name="gemini-pro", temperature=0.3):
+        # LangChain is only imported by the pages and apps that use it
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        key = ("langchain", model_name, temperature)
+        return self._get(key, lambda: ChatGoogleGenerativeAI(model=model_name, temperature=temperature))
+
+    # Context manager that records the latency of one model call
+    @contextmanager
+    def timed(self, model_name):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            with self._lock:
+                self._stats.setdefault(model_name, ModelStats()).record(time.perf_counter() - start, error)
+
+    def stats(self):
+        with self._lock:
+            return {model_name: stats.as_dict() for model_name, stats in self._stats.items()}
+
+    # Function to create the models up front and open their API connection
+    def warmup(self, model_names=WARMUP_MODELS):
+        for model_name in model_names:
+            model = self.get_generative_model(model_name)
+            self.get_chat_model(model_name)
+            try:
+                # count_tokens is free and sets up the connection without generating anything
+                model.count_tokens("warmup")
+            except Exception as e:
+                print(f"Warmup of {model_name} failed: {e}")
+
+
+_default_registry = ModelRegistry()
+
+
+# Function to get the process-wide model registry
+def get_model_registry():
+    return _default_registry
+
+
+# Function to warm up the shared models in the background when GEMINI_WARMUP is set
+def warmup_in_background(model_names=WARMUP_MODELS):
+    if os.getenv("GEMINI_WARMUP"):
+        threading.Thread(target=_default_registry.warmup, args=(model_names,), daemon=True).start()
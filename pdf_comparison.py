@@ -1,8 +1,11 @@
 import os
 import streamlit as st
-from PyPDF2 import PdfReader
-from google.generativeai import configure, embed_content, GenerativeModel
+import pandas as pd
+from google.generativeai import configure
 from dotenv import load_dotenv
+from pdf_extract import extract_text, iter_pdf_pages
+from comparison_engine import compare_documents
+from corpus_similarity import Corpus
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,31 +17,69 @@ st.set_page_config(page_title="PDF Comparison using Google Generative AI", layou
 
 # Function to extract text from a PDF file
 def extract_pdf_text(pdf_file):
-    text = ""
-    reader = PdfReader(pdf_file)
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    return extract_text(pdf_file)
 
-# Function to compare two texts and get AI-based insights
+# Function to compare two texts and get AI-based insights; only the differing paragraphs reach the model
 def compare_texts(text1, text2):
-    model = GenerativeModel("gemini-1.5-flash")
-    prompt = f"""
-    Compare the following two documents for similarities and differences:
+    return compare_documents(text1, text2)["summary"]
 
-    Document 1:
-    {text1}
-
-    Document 2:
-    {text2}
-
-    Describe key similarities, differences, and potential conclusions.
-    """
-    response = model.generate_content(prompt)
-    return response.text if response else "Comparison not available."
+# Function to build the MinHash corpus of uploaded PDFs, page by page; only local work, no model calls
+def build_corpus(pdf_files):
+    corpus = Corpus()
+    for pdf_file in pdf_files:
+        corpus.add_document(pdf_file.name, [text for _, text in iter_pdf_pages(pdf_file)])
+    return corpus
 
 # Streamlit App UI
 st.title("PDF Document Comparison with Google Generative AI")
+mode = st.radio("Mode", ["Two documents", "Corpus"], horizontal=True)
+
+if mode == "Corpus":
+    st.write("Upload a set of PDF files to find near-duplicates; pick a pair to compare in detail.")
+    pdf_files = st.file_uploader("Choose PDF files", type="pdf", accept_multiple_files=True)
+    if len(pdf_files) < 2:
+        st.info("Please upload at least two PDF files.")
+        st.stop()
+
+    # Signatures are built once per set of uploads, not on every rerun
+    corpus_key = tuple(getattr(pdf_file, "file_id", pdf_file.name) for pdf_file in pdf_files)
+    if st.session_state.get("corpus_key") != corpus_key:
+        with st.spinner("Extracting text and building signatures..."):
+            st.session_state.corpus = build_corpus(pdf_files)
+            st.session_state.corpus_key = corpus_key
+    corpus = st.session_state.corpus
+
+    st.subheader("Near-duplicate clusters")
+    clusters = [cluster for cluster in corpus.clusters() if len(cluster) > 1]
+    for number, cluster in enumerate(clusters, start=1):
+        st.write(f"Cluster {number}: " + ", ".join(corpus.names[i] for i in cluster))
+    if not clusters:
+        st.write(f"No documents above {corpus.threshold:.0%} estimated similarity.")
+    if corpus.empty:
+        st.warning("No extractable text, left out of the comparison: " + ", ".join(corpus.names[i] for i in corpus.empty))
+
+    # Pages reused across documents that are otherwise different, e.g. a shared terms or disclaimer page
+    clustered = {i: number for number, cluster in enumerate(corpus.clusters()) for i in cluster}
+    shared = [match for match in corpus.shared_pages() if clustered[match[0]] != clustered[match[2]]]
+    if shared:
+        st.subheader("Shared pages")
+        for i, page_i, j, page_j, similarity in shared[:50]:
+            st.write(f"{corpus.names[i]} p. {page_i + 1} ↔ {corpus.names[j]} p. {page_j + 1} ({similarity:.2f})")
+
+    st.subheader("Similarity matrix")
+    matrix = corpus.similarity_matrix()
+    st.dataframe(pd.DataFrame(matrix, index=corpus.names, columns=corpus.names).style.format("{:.2f}"))
+
+    # Only the pair the user drills into is sent to the model
+    st.subheader("Compare a pair")
+    pairs = sorted(((i, j) for i in range(len(corpus.names)) for j in range(i + 1, len(corpus.names))),
+                   key=lambda pair: -matrix[pair])
+    pair = st.selectbox("Pair", pairs, format_func=lambda pair: f"{corpus.names[pair[0]]} ↔ {corpus.names[pair[1]]} ({matrix[pair]:.2f})")
+    if st.button("Compare"):
+        with st.spinner("Comparing documents..."):
+            st.write(compare_texts(corpus.texts[pair[0]], corpus.texts[pair[1]]))
+    st.stop()
+
 st.write("Upload two PDF files to compare.")
 
 # File uploader
@@ -53,10 +94,13 @@ if pdf_file1 and pdf_file2:
 
     # Compare the extracted text
     with st.spinner("Comparing documents..."):
-        comparison_result = compare_texts(text1, text2)
+        comparison = compare_documents(text1, text2)
     
     # Display the result
     st.subheader("Comparison Results")
-    st.write(comparison_result)
+    st.write(comparison["summary"])
+    stats = comparison["stats"]
+    st.caption(f"{stats['equal_paragraphs']} of {stats['paragraphs']} paragraphs identical · "
+               f"{stats['regions']} changed regions · {stats['sent_tokens']} of {stats['document_tokens']} tokens sent")
 else:
     st.info("Please upload two PDF files for comparison.")
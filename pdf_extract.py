@@ -0,0 +1,168 @@
+import io
+import os
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PyPDF2 import PdfReader
+
+# Pages of already seen PDFs are cached here, keyed by (content hash, page index)
+PDF_PAGE_CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", "pdf_page_cache")
+# PDFs with fewer pages than this are not worth shipping to worker processes
+PARALLEL_MIN_PAGES = 16
+PDF_MAX_WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+# In a worker process: the content hash and reader of the PDF it parsed last, reused by later ranges
+_worker_reader = (None, None)
+
+
+class PageCache:
+    """SQLite cache of extracted page texts."""
+
+    def __init__(self, cache_dir=PDF_PAGE_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "pages.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pdfs (pdf_hash TEXT PRIMARY KEY, page_count INTEGER NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "pdf_hash TEXT NOT NULL, page_index INTEGER NOT NULL, text TEXT NOT NULL, "
+            "PRIMARY KEY (pdf_hash, page_index))"
+        )
+        self._db.commit()
+
+    def page_count(self, pdf_hash):
+        with self._lock:
+            row = self._db.execute("SELECT page_count FROM pdfs WHERE pdf_hash = ?", (pdf_hash,)).fetchone()
+        return row[0] if row else None
+
+    def pages(self, pdf_hash):
+        with self._lock:
+            rows = self._db.execute("SELECT page_index, text FROM pages WHERE pdf_hash = ?", (pdf_hash,)).fetchall()
+        return dict(rows)
+
+    def put_page_count(self, pdf_hash, page_count):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO pdfs (pdf_hash, page_count) VALUES (?, ?)", (pdf_hash, page_count))
+            self._db.commit()
+
+    def put_pages(self, pdf_hash, pages):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages (pdf_hash, page_index, text) VALUES (?, ?, ?)",
+                [(pdf_hash, index, text) for index, text in pages],
+            )
+            self._db.commit()
+
+
+_default_cache = None
+
+
+# Function to get the process-wide page cache
+def get_page_cache():
+    global _default_cache
+    with _pool_lock:
+        if _default_cache is None:
+            _default_cache = PageCache()
+        return _default_cache
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking the multi-threaded Streamlit server can copy held locks into the child and deadlock
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=PDF_MAX_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+# Worker function: extract a contiguous range of pages from a PDF file; only the path crosses the pipe
+def _extract_range(path, pdf_hash, start, stop):
+    global _worker_reader
+    if _worker_reader[0] != pdf_hash:
+        _worker_reader = (pdf_hash, PdfReader(path))
+    reader = _worker_reader[1]
+    return [(index, reader.pages[index].extract_text() or "") for index in range(start, stop)]
+
+
+def _read_bytes(pdf):
+    if isinstance(pdf, (bytes, bytearray)):
+        return bytes(pdf)
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, "rb") as fh:
+            return fh.read()
+    if hasattr(pdf, "getvalue"):
+        return pdf.getvalue()
+    pdf.seek(0)
+    return pdf.read()
+
+
+# Generator yielding (page_number, text) in page order, extracting uncached pages in parallel
+def iter_pdf_pages(pdf, cache=None, max_workers=None):
+    data = _read_bytes(pdf)
+    pdf_hash = hashlib.sha256(data).hexdigest()
+    cache = cache or get_page_cache()
+    max_workers = max_workers or PDF_MAX_WORKERS
+
+    page_count = cache.page_count(pdf_hash)
+    if page_count is None:
+        page_count = len(PdfReader(io.BytesIO(data)).pages)
+        cache.put_page_count(pdf_hash, page_count)
+    done = cache.pages(pdf_hash)
+    missing = [index for index in range(page_count) if index not in done]
+
+    if not missing:
+        for index in range(page_count):
+            yield index + 1, done[index]
+        return
+
+    if len(missing) < PARALLEL_MIN_PAGES or max_workers == 1:
+        reader = PdfReader(io.BytesIO(data))
+        for index in range(page_count):
+            if index not in done:
+                done[index] = reader.pages[index].extract_text() or ""
+                cache.put_pages(pdf_hash, [(index, done[index])])
+            yield index + 1, done[index]
+        return
+
+    # One contiguous range per worker: each worker parses the file once and walks the page tree once
+    step = -(-len(missing) // max_workers)
+    ranges = []
+    for position in range(0, len(missing), step):
+        batch = missing[position:position + step]
+        ranges.append((batch[0], batch[-1] + 1))
+    if isinstance(pdf, (str, os.PathLike)):
+        path, temporary = os.fspath(pdf), False
+    else:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as fh:
+            fh.write(data)
+        path, temporary = fh.name, True
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range, path, pdf_hash, start, stop) for start, stop in ranges]
+
+    try:
+        # Pages are yielded as soon as every earlier page is available
+        next_page = 0
+        for future in as_completed(futures):
+            pages = [(index, text) for index, text in future.result() if index not in done]
+            cache.put_pages(pdf_hash, pages)
+            done.update(pages)
+            while next_page < page_count and next_page in done:
+                yield next_page + 1, done[next_page]
+                next_page += 1
+    finally:
+        for future in futures:
+            future.cancel()
+        if temporary:
+            os.remove(path)
+
+
+# Function to extract the full text of one PDF
+def extract_text(pdf, cache=None, max_workers=None):
+    return "".join(text for _, text in iter_pdf_pages(pdf, cache, max_workers))
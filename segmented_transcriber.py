@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from media_tools import ffmpeg_available, media_duration, cut_segment
+from media_uploads import get_upload_manager, file_sha256
+from model_registry import get_model_registry
+
+# Window length and overlap of the segments, in seconds
+SEGMENT_SECONDS = 300
+OVERLAP_SECONDS = 15
+SEGMENT_WORKERS = 4
+SEGMENT_RETRIES = 3
+
+TIMESTAMP_INSTRUCTIONS = (
+    " Prefix every line with its start time relative to the beginning of this clip, "
+    "formatted as [mm:ss]. Output one line per utterance and nothing else."
+)
+TIMESTAMP_LINE = re.compile(r"^\s*\[(?:(\d+):)?(\d{1,2}):(\d{2})(?:\.\d+)?\]\s*(.*)$")
+
+
+# Function to split a recording into overlapping windows
+def plan_segments(duration, window=SEGMENT_SECONDS, overlap=OVERLAP_SECONDS):
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(start + window, duration)
+        segments.append((start, end))
+        if end >= duration:
+            break
+        start = end - overlap
+    return segments
+
+
+# Function to parse "[mm:ss] text" lines into (seconds, text) pairs
+def parse_timestamped(text, offset=0.0):
+    lines = []
+    for raw in text.splitlines():
+        match = TIMESTAMP_LINE.match(raw)
+        if match:
+            hours, minutes, seconds, content = match.groups()
+            at = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + offset
+            lines.append((at, content.strip()))
+        elif raw.strip():
+            # Continuation lines keep the previous timestamp
+            at = lines[-1][0] if lines else offset
+            lines.append((at, raw.strip()))
+    return lines
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"[{hours:d}:{minutes:02d}:{seconds:02d}]" if hours else f"[{minutes:02d}:{seconds:02d}]"
+
+
+def _normalize(text):
+    return re.sub(r"\W+", " ", text).strip().lower()
+
+
+# Function to stitch segment transcripts; each overlap is split at its midpoint and repeated lines dropped
+def stitch(results, segments):
+    stitched = []
+    for index, lines in enumerate(results):
+        start, end = segments[index]
+        lower = (start + segments[index - 1][1]) / 2 if index > 0 else float("-inf")
+        upper = (end + segments[index + 1][0]) / 2 if index + 1 < len(segments) else float("inf")
+        for at, text in lines:
+            if not lower <= at < upper:
+                continue
+            if stitched and _normalize(stitched[-1][1]) == _normalize(text):
+                continue
+            stitched.append((at, text))
+    return "\n".join(f"{format_timestamp(at)} {text}" for at, text in stitched)
+
+
+class SegmentedTranscriber:
+    """Transcribes long recordings as overlapping windows in parallel and stitches the results."""
+
+    def __init__(self, model_name="gemini-1.5-flash", window=SEGMENT_SECONDS, overlap=OVERLAP_SECONDS,
+                 max_workers=SEGMENT_WORKERS, retries=SEGMENT_RETRIES):
+        self.model_name = model_name
+        self.window = window
+        self.overlap = overlap
+        self.max_workers = max_workers
+        self.retries = retries
+        self.models = get_model_registry()
+        self.uploads = get_upload_manager()
+
+    # Function to transcribe one segment, retrying only that segment on failure
+    def _transcribe_segment(self, segment_path, prompt, offset):
+        model = self.models.get_generative_model(self.model_name)
+        content_hash = file_sha256(segment_path)
+        cached = self.uploads.get_transcription(content_hash, prompt, self.model_name)
+        if cached is not None:
+            return parse_timestamped(cached, offset)
+        for attempt in range(self.retries):
+            try:
+                media_file = self.uploads.upload(segment_path, content_hash)
+                with self.models.timed(self.model_name):
+                    response = model.generate_content([prompt, media_file])
+                text = "".join(part.text for part in response.parts) if response.parts else ""
+                self.uploads.put_transcription(content_hash, prompt, self.model_name, text)
+                return parse_timestamped(text, offset)
+            except Exception:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    # Generator yielding the stitched transcript each time more of the recording is done
+    def stream(self, file_path, prompt):
+        uploads = self.uploads
+        segmented_prompt = prompt + TIMESTAMP_INSTRUCTIONS
+        content_hash = file_sha256(file_path)
+        cache_prompt = f"{segmented_prompt}|window={self.window}|overlap={self.overlap}"
+        cached = uploads.get_transcription(content_hash, cache_prompt, self.model_name)
+        if cached is not None:
+            yield cached
+            return
+
+        duration = media_duration(file_path)
+        segments = plan_segments(duration, self.window, self.overlap)
+        suffix = os.path.splitext(file_path)[1]
+        workdir = tempfile.mkdtemp(prefix="segments-")
+        try:
+            results = [None] * len(segments)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                try:
+                    futures = {}
+                    for index, (start, end) in enumerate(segments):
+                        segment_path = cut_segment(file_path, start, end - start, os.path.join(workdir, f"{index:04d}{suffix}"))
+                        futures[pool.submit(self._transcribe_segment, segment_path, segmented_prompt, start)] = index
+                    done_prefix = 0
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        # Only the contiguous finished prefix is shown, so the text never changes order
+                        if results[done_prefix] is not None:
+                            while done_prefix < len(results) and results[done_prefix] is not None:
+                                done_prefix += 1
+                            yield stitch(results[:done_prefix], segments[:done_prefix])
+                except BaseException:
+                    # A failed segment or an abandoned stream fails the whole transcript: drop the queued
+                    # segments so leaving the pool only waits for the ones already in flight
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            transcript = stitch(results, segments)
+            uploads.put_transcription(content_hash, cache_prompt, self.model_name, transcript)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # Function to transcribe a recording and return the final stitched transcript
+    def transcribe(self, file_path, prompt):
+        transcript = ""
+        for transcript in self.stream(file_path, prompt):
+            pass
+        return transcript
+
+
+# Function to tell whether a recording is long enough to be worth segmenting
+def should_segment(file_path, window=SEGMENT_SECONDS):
+    if not ffmpeg_available():
+        return False
+    try:
+        return media_duration(file_path) > window
+    except Exception:
+        return False
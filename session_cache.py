@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Memory allowed for the upload artifacts of one Streamlit session
+SESSION_CACHE_BYTES = int(os.getenv("SESSION_CACHE_BYTES", str(64 * 1024 * 1024)))
+SESSION_STATE_KEY = "_session_cache"
+
+
+# Function to identify an uploaded file across reruns without reading its content
+def upload_key(uploaded_file):
+    file_id = getattr(uploaded_file, "file_id", None)
+    return file_id or f"{uploaded_file.name}:{uploaded_file.size}"
+
+
+# Function to estimate the memory held by a cached value
+def _sizeof(value):
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class SessionCache:
+    """LRU of per-upload artifacts for one session, bounded by their approximate size."""
+
+    def __init__(self, max_bytes=SESSION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, key):
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, kind, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            self._pop((kind, key))
+            if size > self.max_bytes:
+                return
+            self._entries[(kind, key)] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    # Function to get a cached artifact, creating and caching it on a miss
+    def get_or_create(self, kind, key, factory):
+        value = self.get(kind, key)
+        if value is None:
+            value = factory()
+            self.put(kind, key, value)
+        return value
+
+    def _pop(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    # Function to drop one artifact, every artifact of a kind, or everything
+    def invalidate(self, kind=None, key=None):
+        with self._lock:
+            for entry_key in list(self._entries):
+                if (kind is None or entry_key[0] == kind) and (key is None or entry_key[1] == key):
+                    self._pop(entry_key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Function to get the cache of the current Streamlit session, creating it on first use
+def get_session_cache(session_state):
+    if SESSION_STATE_KEY not in session_state:
+        session_state[SESSION_STATE_KEY] = SessionCache()
+    return session_state[SESSION_STATE_KEY]
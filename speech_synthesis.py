@@ -0,0 +1,212 @@
+import io
+import os
+import re
+import time
+import queue
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Synthesized phrases are kept here, keyed by (language, text), up to a total size
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+# Sentences synthesized at the same time while earlier ones play
+TTS_WORKERS = 3
+# Also play on the server's own speakers; only useful when the app runs on the listener's machine
+TTS_LOCAL_PLAYBACK = os.getenv("TTS_LOCAL_PLAYBACK", "0") == "1"
+# Shorter fragments are joined to the next sentence; gTTS pauses audibly between requests
+MIN_SENTENCE_CHARS = 40
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+
+
+# Function to strip Markdown markup that would otherwise be read out loud
+def speakable_text(text):
+    text = re.sub(r"```.*?```", " ", text, flags=re.S)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"^\s*(#+|[-*+]|\d+\.)\s+", "", text, flags=re.M)
+    return re.sub(r"[*_`#>]+", "", text).strip()
+
+
+class SentenceSplitter:
+    """Cuts streamed text into whole sentences as soon as each one is complete."""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class PhraseCache:
+    """SQLite cache of synthesized MP3 audio, evicting the least recently used phrases beyond a size."""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "phrases.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS phrases (key TEXT PRIMARY KEY, audio BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text, lang):
+        key = self.key(text, lang)
+        with self._lock:
+            row = self._db.execute("SELECT audio FROM phrases WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE phrases SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return bytes(row[0])
+
+    def put(self, text, lang, audio):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO phrases (key, audio, size, last_used) VALUES (?, ?, ?, ?)",
+                (self.key(text, lang), audio, len(audio), time.time()),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM phrases").fetchone()[0]
+            while total > self.max_bytes:
+                key, size = self._db.execute("SELECT key, size FROM phrases ORDER BY last_used LIMIT 1").fetchone()
+                self._db.execute("DELETE FROM phrases WHERE key = ?", (key,))
+                total -= size
+            self._db.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide phrase cache
+def get_phrase_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PhraseCache()
+        return _default_cache
+
+
+# Function to synthesize one phrase to MP3 bytes, served from the cache when it was spoken before
+def synthesize(text, lang="en", cache=None):
+    from gtts import gTTS
+    cache = cache or get_phrase_cache()
+    audio = cache.get(text, lang)
+    if audio is None:
+        # Written to memory, not to a temporary file
+        buffer = io.BytesIO()
+        gTTS(text, lang=lang).write_to_fp(buffer)
+        audio = buffer.getvalue()
+        cache.put(text, lang, audio)
+    return audio
+
+
+# Function to play MP3 bytes on the local speakers through a temporary file that is always removed
+def play_audio(audio):
+    from playsound import playsound
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fh:
+        fh.write(audio)
+        path = fh.name
+    try:
+        playsound(path)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SpeechPipeline:
+    """Speaks a streamed response sentence by sentence: later sentences are synthesized while earlier ones play."""
+
+    def __init__(self, lang="en", play=TTS_LOCAL_PLAYBACK, workers=TTS_WORKERS, cache=None):
+        self.lang = lang
+        self.local_playback = play
+        self.cache = cache or get_phrase_cache()
+        self.splitter = SentenceSplitter()
+        self.started = time.perf_counter()
+        self.first_audio_seconds = None
+        self.play_errors = []
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        self._handed_out = 0
+        self._playback = queue.Queue()
+        self._player = threading.Thread(target=self._play, daemon=True) if play else None
+        if self._player:
+            self._player.start()
+
+    def _synthesize(self, sentence):
+        return synthesize(sentence, self.lang, self.cache)
+
+    # Function to record that the listener starts hearing audio now, by the speakers or the page
+    def audio_started(self):
+        if self.first_audio_seconds is None:
+            self.first_audio_seconds = time.perf_counter() - self.started
+
+    # Plays sentences strictly in order, each as soon as it has been synthesized
+    def _play(self):
+        while True:
+            future = self._playback.get()
+            if future is None:
+                return
+            try:
+                audio = future.result()
+                self.audio_started()
+                play_audio(audio)
+            except Exception as e:
+                # Headless servers have no audio device; the UI still gets the audio
+                self.play_errors.append(e)
+
+    def _submit(self, sentences):
+        for sentence in sentences:
+            text = speakable_text(sentence)
+            if text:
+                future = self._pool.submit(self._synthesize, text)
+                self._futures.append(future)
+                if self._player:
+                    self._playback.put(future)
+
+    # Function to pass the next piece of streamed text
+    def feed(self, text):
+        self._submit(self.splitter.feed(text))
+
+    # Function to take the sentences synthesized since the last call, in order, stopping at the first still running
+    def ready(self):
+        clips = []
+        while self._handed_out < len(self._futures) and self._futures[self._handed_out].done():
+            clips.append(self._futures[self._handed_out].result())
+            self._handed_out += 1
+        return clips
+
+    # Function to synthesize the rest and return the whole response as one MP3
+    def finish(self, wait_for_playback=False):
+        self._submit(self.splitter.flush())
+        try:
+            # MP3 frames can be concatenated, so the sentences join into one playable file
+            return b"".join(future.result() for future in self._futures)
+        finally:
+            self._pool.shutdown(wait=False)
+            if self._player:
+                self._playback.put(None)
+                if wait_for_playback:
+                    self._player.join()
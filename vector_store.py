@@ -0,0 +1,427 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+from langchain_community.vectorstores import FAISS
+from index_registry import get_index_registry, INDEX_REGISTRY_MAX_ENTRIES
+from ann_index import build_faiss_store, choose_index_spec, supports_remove, tune_index, evaluate_recall, reconstruct_vectors
+from keyword_index import KeywordIndex, hybrid_search
+
+# Every namespace lives in its own directory below this root
+VECTOR_STORE_ROOT = os.getenv("VECTOR_STORE_ROOT", "faiss_index")
+DEFAULT_NAMESPACE = "default"
+# Tombstoned chunks are compacted away once they make up this share of the index
+COMPACT_RATIO = 0.25
+SNAPSHOTS_TO_KEEP = 2
+# A snapshot is only a manifest; it lists the immutable segments that make up the index
+SNAPSHOT_FILES = ("manifest.json",)
+# Per-session collections are removed once nothing has been written to them for this long
+SESSION_NAMESPACE_PREFIX = "session-"
+SESSION_NAMESPACE_TTL_SECONDS = int(os.getenv("SESSION_NAMESPACE_TTL_SECONDS", str(3 * 24 * 3600)))
+
+_namespace_locks = {}
+_namespace_locks_lock = threading.Lock()
+# Keyword indexes loaded per snapshot directory, bounded like the FAISS indexes
+_keyword_indexes = OrderedDict()
+_keyword_indexes_lock = threading.Lock()
+# Chunk ID to row maps of loaded indexes, dropped together with the index
+_row_maps = weakref.WeakKeyDictionary()
+
+
+# Function to derive a stable document ID from the document's content
+def document_id(content):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+# Function to derive a stable chunk ID from its document ID and position
+def chunk_id(doc_id, position):
+    return f"{doc_id}:{position:05d}"
+
+
+def _remember_keywords(snapshot, keywords):
+    with _keyword_indexes_lock:
+        _keyword_indexes[snapshot] = keywords
+        _keyword_indexes.move_to_end(snapshot)
+        while len(_keyword_indexes) > INDEX_REGISTRY_MAX_ENTRIES:
+            _keyword_indexes.popitem(last=False)
+
+
+# Function to append every chunk of a LangChain FAISS store to another one, vectors included
+def _append_store(index, other):
+    ids = [cid for _, cid in sorted(other.index_to_docstore_id.items())]
+    if not ids:
+        return
+    docs = [other.docstore.search(cid) for cid in ids]
+    vectors = other.index.reconstruct_n(0, other.index.ntotal)
+    index.add_embeddings(list(zip([doc.page_content for doc in docs], vectors)),
+                         metadatas=[doc.metadata for doc in docs], ids=ids)
+
+
+# Function to find the index rows of chunk IDs; the cached map is rebuilt when adds or deletes have moved rows
+def _rows(index, chunk_ids):
+    row_of = _row_maps.get(index)
+    if row_of is None or any(index.index_to_docstore_id.get(row_of.get(cid)) != cid for cid in chunk_ids):
+        row_of = {cid: row for row, cid in index.index_to_docstore_id.items()}
+        _row_maps[index] = row_of
+    return [row_of[cid] for cid in chunk_ids]
+
+
+def _namespace_lock(path):
+    with _namespace_locks_lock:
+        return _namespace_locks.setdefault(path, threading.RLock())
+
+
+class DocumentStore:
+    """A FAISS store scoped to one user or collection, with per-document add, delete and compaction.
+
+    On disk the index is a base segment plus append-only delta segments, so an add writes only its own chunks.
+    """
+
+    def __init__(self, namespace=DEFAULT_NAMESPACE, root=VECTOR_STORE_ROOT, registry=None):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace) or DEFAULT_NAMESPACE
+        self.namespace = namespace
+        self.path = os.path.join(root, safe_name)
+        self.registry = registry if registry is not None else get_index_registry()
+        self._lock = _namespace_lock(os.path.abspath(self.path))
+
+    # The CURRENT file names the latest complete snapshot directory
+    def _current_snapshot(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as fh:
+                return os.path.join(self.path, fh.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def _manifest(self, snapshot=None):
+        snapshot = snapshot or self._current_snapshot()
+        if snapshot is None:
+            return {"generation": 0, "index_spec": "Flat", "documents": {}, "segments": [], "next_segment": 1}
+        with open(os.path.join(snapshot, "manifest.json")) as fh:
+            return json.load(fh)
+
+    # Function to list the segment directories of a manifest, base first
+    def _segments(self, manifest):
+        return [os.path.join(self.path, segment["name"]) for segment in manifest["segments"]]
+
+    def _load_segment(self, path):
+        return FAISS.load_local(path, self.registry.embeddings, allow_dangerous_deserialization=True)
+
+    # Function to load a snapshot: the base segment, with every delta segment appended in order
+    def _load(self, snapshot):
+        segments = self._segments(self._manifest(snapshot))
+        index = self._load_segment(segments[0])
+        for path in segments[1:]:
+            _append_store(index, self._load_segment(path))
+        return index
+
+    def _index(self):
+        snapshot = self._current_snapshot()
+        if not snapshot:
+            return None
+        index = self.registry.get(snapshot, loader=self._load, files=SNAPSHOT_FILES)
+        tune_index(index.index)
+        return index
+
+    # Function to get the keyword index that belongs to the current snapshot
+    def _keywords(self):
+        snapshot = self._current_snapshot()
+        if not snapshot:
+            return KeywordIndex()
+        with _keyword_indexes_lock:
+            keywords = _keyword_indexes.get(snapshot)
+            if keywords is not None:
+                _keyword_indexes.move_to_end(snapshot)
+        if keywords is None:
+            keywords = KeywordIndex()
+            for segment in self._segments(self._manifest(snapshot)):
+                keywords.update(KeywordIndex.load(os.path.join(segment, "keywords.json")))
+            _remember_keywords(snapshot, keywords)
+        return keywords
+
+    # Function to rebuild the index with a new index type, leaving out the given chunks.
+    # Vectors are read back from the current index, so a rebuild never calls the embedding API.
+    def _rebuild(self, index, spec, drop_chunk_ids=()):
+        drop = set(drop_chunk_ids)
+        kept = [(row, cid) for row, cid in sorted(index.index_to_docstore_id.items()) if cid not in drop]
+        rows, ids = [row for row, _ in kept], [cid for _, cid in kept]
+        docs = [index.docstore.search(cid) for cid in ids]
+        texts = [doc.page_content for doc in docs]
+        vectors = reconstruct_vectors(index.index, rows)
+        return build_faiss_store(texts, vectors, self.registry.embeddings, [doc.metadata for doc in docs], ids, spec)
+
+    def _write_segment(self, manifest, index, keywords):
+        name = f"segment-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        target = os.path.join(self.path, name)
+        staging = target + ".tmp"
+        # Left over from an interrupted write that no snapshot refers to
+        for leftover in (staging, target):
+            shutil.rmtree(leftover, ignore_errors=True)
+        index.save_local(staging)
+        keywords.save(os.path.join(staging, "keywords.json"))
+        os.replace(staging, target)
+        return {"name": name, "chunks": index.index.ntotal}
+
+    # Function to merge the newest delta segments while they are at least half the size of the one before,
+    # so a chunk is rewritten O(log n) times. Once the deltas outgrow the base, the whole index becomes the new base.
+    def _merge_segments(self, index, keywords, manifest):
+        segments = manifest["segments"]
+        if len(segments) > 1 and sum(segment["chunks"] for segment in segments[1:]) >= segments[0]["chunks"]:
+            manifest["segments"] = [self._write_segment(manifest, index, keywords)]
+            return
+        while len(segments) > 2 and 2 * segments[-1]["chunks"] >= segments[-2]["chunks"]:
+            older, newer = [os.path.join(self.path, segment["name"]) for segment in segments[-2:]]
+            merged = self._load_segment(older)
+            _append_store(merged, self._load_segment(newer))
+            merged_keywords = KeywordIndex.load(os.path.join(older, "keywords.json"))
+            merged_keywords.update(KeywordIndex.load(os.path.join(newer, "keywords.json")))
+            segments[-2:] = [self._write_segment(manifest, merged, merged_keywords)]
+
+    # Function to persist a change and switch CURRENT to a new snapshot atomically. With rewrite the whole index
+    # becomes the new base segment; otherwise a delta (store and keyword index of the new chunks only) is appended
+    # as a segment, and without a delta only the manifest changes, as for a tombstone.
+    def _snapshot(self, index, manifest, keywords, delta=None, rewrite=True):
+        os.makedirs(self.path, exist_ok=True)
+        manifest["generation"] += 1
+        if rewrite or not manifest["segments"]:
+            manifest["segments"] = [self._write_segment(manifest, index, keywords)]
+        elif delta is not None:
+            manifest["segments"].append(self._write_segment(manifest, *delta))
+            self._merge_segments(index, keywords, manifest)
+        name = f"snapshot-{manifest['generation']:06d}"
+        target = os.path.join(self.path, name)
+        staging = target + ".tmp"
+        for leftover in (staging, target):
+            shutil.rmtree(leftover, ignore_errors=True)
+        os.makedirs(staging)
+        with open(os.path.join(staging, "manifest.json"), "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(staging, target)
+        pointer = os.path.join(self.path, "CURRENT.tmp")
+        with open(pointer, "w") as fh:
+            fh.write(name)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(pointer, os.path.join(self.path, "CURRENT"))
+        self.registry.put(target, index, files=SNAPSHOT_FILES)
+        _remember_keywords(target, keywords)
+        self._prune_snapshots(name)
+
+    # Function to delete old snapshots, then every segment that no kept snapshot refers to
+    def _prune_snapshots(self, current):
+        entries = [entry for entry in os.listdir(self.path) if not entry.endswith(".tmp")]
+        snapshots = sorted(entry for entry in entries if entry.startswith("snapshot-"))
+        kept = snapshots[-SNAPSHOTS_TO_KEEP:]
+        if current not in kept:
+            kept.append(current)
+        for old in snapshots:
+            if old not in kept:
+                self.registry.invalidate(os.path.join(self.path, old))
+                with _keyword_indexes_lock:
+                    _keyword_indexes.pop(os.path.join(self.path, old), None)
+                shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+        referenced = set()
+        for snapshot in kept:
+            referenced.update(self._segments(self._manifest(os.path.join(self.path, snapshot))))
+        for entry in entries:
+            if entry.startswith("segment-") and os.path.join(self.path, entry) not in referenced:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def documents(self):
+        with self._lock:
+            return {doc_id: info for doc_id, info in self._manifest()["documents"].items() if not info.get("deleted")}
+
+    def has_document(self, doc_id):
+        return doc_id in self.documents()
+
+    def version(self):
+        snapshot = self._current_snapshot()
+        return (snapshot, self.registry.version(snapshot, SNAPSHOT_FILES)) if snapshot else None
+
+    # Function to append one document; only its own chunks are embedded
+    def add_document(self, doc_id, chunks, name=None, vectors=None):
+        return bool(self.add_documents([(doc_id, chunks, name, vectors)]))
+
+    # Function to append several documents, given as (doc_id, chunks, name, vectors), in one snapshot.
+    # Vectors may be None to embed the chunks here; returns the IDs of the documents that were added.
+    def add_documents(self, documents):
+        with self._lock:
+            manifest = self._manifest()
+            batch = {}
+            for doc_id, chunks, name, vectors in documents:
+                existing = manifest["documents"].get(doc_id)
+                if chunks and doc_id not in batch and not (existing and not existing.get("deleted")):
+                    batch[doc_id] = (chunks, name, vectors)
+            if not batch:
+                return []
+            index = self._index()
+            keywords = self._keywords()
+            # Re-adding tombstoned documents: drop their old chunks first, which rewrites the whole index
+            readded = [doc_id for doc_id in batch if doc_id in manifest["documents"]]
+            full = bool(readded) or index is None
+            if readded:
+                index = self._compact(index, keywords, manifest, readded)
+            texts, matrix, ids, metadatas = [], [], [], []
+            for doc_id, (chunks, name, vectors) in batch.items():
+                if vectors is None:
+                    vectors = self.registry.embeddings.embed_matrix(chunks)
+                doc_ids = [chunk_id(doc_id, i) for i in range(len(chunks))]
+                texts += chunks
+                matrix += list(vectors)
+                ids += doc_ids
+                metadatas += [{"doc_id": doc_id, "chunk_id": cid, "source": name} for cid in doc_ids]
+                manifest["documents"][doc_id] = {"name": name, "chunk_ids": doc_ids, "deleted": False}
+            if index is None:
+                index = build_faiss_store(texts, matrix, self.registry.embeddings, metadatas, ids, manifest["index_spec"])
+            else:
+                index.add_embeddings(list(zip(texts, matrix)), metadatas=metadatas, ids=ids)
+            added = KeywordIndex.from_texts(texts, ids)
+            keywords.update(added)
+            # Switch to an approximate, quantized index once the collection outgrows the current one
+            spec = choose_index_spec(index.index.ntotal, index.index.d)
+            if spec != manifest["index_spec"] and not manifest.get("index_spec_pinned"):
+                index = self._rebuild(index, spec)
+                manifest["index_spec"] = spec
+                full = True
+            delta = None if full else (build_faiss_store(texts, matrix, self.registry.embeddings, metadatas, ids, "Flat"), added)
+            self._snapshot(index, manifest, keywords, delta, rewrite=full)
+            return list(batch)
+
+    # Function to tombstone a document; its chunks stay in the index until compaction
+    def delete_document(self, doc_id):
+        with self._lock:
+            manifest = self._manifest()
+            info = manifest["documents"].get(doc_id)
+            if not info or info.get("deleted"):
+                return False
+            info["deleted"] = True
+            tombstoned = sum(len(d["chunk_ids"]) for d in manifest["documents"].values() if d.get("deleted"))
+            total = sum(len(d["chunk_ids"]) for d in manifest["documents"].values())
+            index = self._index()
+            keywords = self._keywords()
+            compacted = bool(total and tombstoned / total >= COMPACT_RATIO)
+            if compacted:
+                index = self._compact(index, keywords, manifest)
+            self._snapshot(index, manifest, keywords, rewrite=compacted)
+            return True
+
+    def _compact(self, index, keywords, manifest, doc_ids=None):
+        doomed = [doc_id for doc_id, info in manifest["documents"].items()
+                  if info.get("deleted") and (doc_ids is None or doc_id in doc_ids)]
+        chunk_ids = [cid for doc_id in doomed for cid in manifest["documents"][doc_id]["chunk_ids"]]
+        keywords.remove(chunk_ids)
+        if index is not None and chunk_ids:
+            if supports_remove(manifest["index_spec"]):
+                index.delete(chunk_ids)
+            else:
+                # IVF and HNSW indexes cannot remove vectors the way LangChain's delete expects
+                index = self._rebuild(index, manifest["index_spec"], chunk_ids)
+        for doc_id in doomed:
+            del manifest["documents"][doc_id]
+        return index
+
+    # Function to physically remove every tombstoned chunk
+    def compact(self):
+        with self._lock:
+            manifest = self._manifest()
+            if not any(info.get("deleted") for info in manifest["documents"].values()):
+                return
+            index = self._index()
+            keywords = self._keywords()
+            self._snapshot(self._compact(index, keywords, manifest), manifest, keywords)
+
+    # Function to force an index type, e.g. "Flat", "HNSW32,SQ8" or "IVF1024,PQ96x8"
+    def reindex(self, spec):
+        with self._lock:
+            manifest = self._manifest()
+            index = self._index()
+            if index is None:
+                return
+            manifest["index_spec"] = spec
+            manifest["index_spec_pinned"] = True
+            self._snapshot(self._rebuild(index, spec), manifest, self._keywords())
+
+    # Function to report recall@k of the current index against exact search
+    def evaluate_index(self, k=10, n_queries=200):
+        with self._lock:
+            index = self._index()
+            if index is None:
+                return None
+            # Measured against exact search over the stored vectors; for quantized indexes these are the decoded codes
+            vectors = reconstruct_vectors(index.index)
+            report = evaluate_recall(index.index, vectors, k, n_queries)
+            report["index_spec"] = self._manifest()["index_spec"]
+            return report
+
+    def similarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(self.registry.embeddings.embed_query(query), k)
+
+    # Function to search with an already computed query embedding
+    def similarity_search_by_vector(self, embedding, k=4):
+        with self._lock:
+            index = self._index()
+            if index is None:
+                return []
+            documents = self._manifest()["documents"]
+            deleted = {doc_id for doc_id, info in documents.items() if info.get("deleted")}
+            fetch_k = k + sum(len(documents[doc_id]["chunk_ids"]) for doc_id in deleted)
+            docs = index.similarity_search_by_vector(embedding, k=fetch_k)
+        return [doc for doc in docs if doc.metadata.get("doc_id") not in deleted][:k]
+
+
+    # Function to get the stored vectors of chunks, read from the index rather than embedded again
+    def vectors(self, chunk_ids):
+        with self._lock:
+            index = self._index()
+            return reconstruct_vectors(index.index, _rows(index, chunk_ids))
+
+    # Function to retrieve chunks by vector similarity and BM25 keyword match, fused by rank
+    def hybrid_search(self, query, k=4, embedding=None):
+        with self._lock:
+            index = self._index()
+            if index is None:
+                return []
+            documents = self._manifest()["documents"]
+            deleted = [cid for info in documents.values() if info.get("deleted") for cid in info["chunk_ids"]]
+            return hybrid_search(index, self._keywords(), query, k, embedding, exclude=deleted)
+
+
+# Function to drop every loaded FAISS and keyword index; they are reloaded from disk on next use
+def clear_loaded_indexes():
+    get_index_registry().invalidate()
+    with _keyword_indexes_lock:
+        _keyword_indexes.clear()
+
+
+# Function to delete per-session collections that have been idle past the TTL, with their loaded indexes
+def remove_idle_namespaces(prefix=SESSION_NAMESPACE_PREFIX, max_idle_seconds=SESSION_NAMESPACE_TTL_SECONDS,
+                           root=VECTOR_STORE_ROOT):
+    if not os.path.isdir(root):
+        return []
+    removed = []
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if not entry.startswith(prefix) or not os.path.isdir(path):
+            continue
+        with _namespace_lock(os.path.abspath(path)):
+            try:
+                last_write = os.path.getmtime(os.path.join(path, "CURRENT"))
+            except FileNotFoundError:
+                last_write = os.path.getmtime(path)
+            if time.time() - last_write < max_idle_seconds:
+                continue
+            registry = get_index_registry()
+            for snapshot in os.listdir(path):
+                registry.invalidate(os.path.join(path, snapshot))
+                with _keyword_indexes_lock:
+                    _keyword_indexes.pop(os.path.join(path, snapshot), None)
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(entry)
+    return removed